@@ -1,11 +1,7 @@
 import streamlit as st
 import os
-import torch
 import random
-import pandas as pd
-from sklearn.model_selection import train_test_split
 import sys
-import sqlite3
 from datetime import datetime, timedelta
 import re
 import time
@@ -14,41 +10,73 @@ import dns.resolver
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.tipo import nltk_utils
+import artifact
+import availability
+import batching
 import book_appointment
-from modelo.model import CustomRNNModel
-from data.Healthguide import health_advice
-from app.tipo.responses import greetings, responses, farewell, replies
+import db
+import inference
+import intent_router
+import label_table
+import prediction_cache
+import symptom_state
+import tracing
+from app.tipo.responses import responses, replies
 
 load_dotenv()
 
 
-def load_disease_names(file_path):
-    ConditionNames = {}
-    with open(file_path, 'r') as file:
-        for line in file:
-            pairs = line.strip().split(',')
-            for pair in pairs:
-                if ':' in pair:
-                    key, value = pair.split(':', 1)
-                    ConditionNames[int(key)] = value
-    return ConditionNames
+file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'nome.txt')
 
 
-file_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'nome.txt')
-names = load_disease_names(file_path)
+@st.cache_resource
+def load_inference_context():
+    return inference.get_inference_context(names_path=file_path,
+                                           bundle_path=os.getenv('INFERENCE_BUNDLE', artifact.BUNDLE_PATH),
+                                           engine=os.getenv('INFERENCE_ENGINE', 'torch'),
+                                           variant=os.getenv('MODEL_VARIANT', 'fp32'),
+                                           ensemble=tuple(name for name in os.getenv('INFERENCE_ENSEMBLE',
+                                                                                     'linear,centroid').split(',')
+                                                          if name),
+                                           ensemble_budget_ms=float(os.getenv('ENSEMBLE_BUDGET_MS', '2')))
+
+
+@st.cache_resource
+def load_batcher():
+    return batching.MicroBatcher(load_inference_context(),
+                                 max_batch_size=int(os.getenv('MICROBATCH_MAX_SIZE', '32')),
+                                 max_wait_ms=float(os.getenv('MICROBATCH_MAX_WAIT_MS', '5')),
+                                 timeout_ms=float(os.getenv('MICROBATCH_TIMEOUT_MS', '10000')))
+
+
+@st.cache_resource
+def load_prediction_cache():
+    context = load_inference_context()
+    return prediction_cache.PredictionCache(prediction_cache.key_function(context.featurizer),
+                                            max_entries=int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '4096')),
+                                            max_bytes=int(os.getenv('PREDICTION_CACHE_MAX_BYTES', '4194304')),
+                                            ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '3600')),
+                                            artifact_id=context.artifact_id,
+                                            cut_short=getattr(context.engine, 'cut_short_rows', None))
+
 
-df = pd.read_csv('data/Symptom2Disease.csv')
-df.drop('Unnamed: 0', axis=1, inplace=True)
-df.drop_duplicates(inplace=True)
-train_data, test_data = train_test_split(df, test_size=0.15, random_state=42)
+@st.cache_resource
+def load_label_table():
+    # Raises at startup if any class has no advice or doctor, instead of replying "No advice available".
+    context = load_inference_context()
+    return label_table.build_label_table(context.names, context.health_advice, book_appointment.disease_to_doctor)
 
-vectorizer = nltk_utils.cria_tfidf_vector()
-vectorizer.fit(train_data['text'])
 
-model = CustomRNNModel()
-model.load_state_dict(torch.load(
-    'modelo/trem_model.pth', map_location=torch.device('cpu')))
+@st.cache_resource
+def load_intent_router():
+    return intent_router.build_router()
+
+
+context = load_inference_context()
+batcher = load_batcher()
+cache = load_prediction_cache()
+router = load_intent_router()
+labels = load_label_table()
 
 if 'chat_history' not in st.session_state:
     st.session_state['chat_history'] = []
@@ -64,31 +92,22 @@ if 'chosen_date' not in st.session_state:
     st.session_state['chosen_date'] = None
 if 'selected_time' not in st.session_state:
     st.session_state['selected_time'] = None
+if 'offered_slots' not in st.session_state:
+    st.session_state['offered_slots'] = []
+if 'symptom_state' not in st.session_state:
+    # Needs the compiled featurizer's term counts; with the sklearn fallback every message stands alone.
+    st.session_state['symptom_state'] = None
+    if hasattr(context.featurizer, 'column_counts'):
+        st.session_state['symptom_state'] = symptom_state.SymptomState(
+            context.featurizer, context.engine, max_turns=int(os.getenv('SYMPTOM_STATE_MAX_TURNS', '5')))
 
-CONFIDENCE_THRESHOLD = 0.7
-
+CONFIDENCE_THRESHOLD = inference.CONFIDENCE_THRESHOLD
+EVIDENCE_EXAMPLES = int(os.getenv('EVIDENCE_EXAMPLES', '3'))
+NEXT_SLOTS_COUNT = int(os.getenv('NEXT_SLOTS_COUNT', '3'))
+NEXT_SLOTS_DAYS = int(os.getenv('NEXT_SLOTS_DAYS', '14'))
 
-def initialize_db():
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            appointment_number INTEGER NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            phone TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            doctor TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
 
-
-initialize_db()
+db.initialize()
 
 
 def validate_input(user_input):
@@ -143,22 +162,11 @@ def validate_datetime(date_str, time_str=None):
 
 
 def is_time_slot_available(date_str, time_str, doctor):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE date = ? AND time = ? AND doctor = ?",
-                   (date_str, time_str, doctor))
-    available = cursor.fetchone() is None
-    conn.close()
-    return available
+    return db.slot_available(date_str, time_str, doctor)
 
 
 def get_occupied_time_slots(date_str, doctor):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT time FROM appointments WHERE date = ? AND doctor = ?", (date_str, doctor))
-    occupied_slots = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return occupied_slots
+    return db.occupied_times(date_str, doctor)
 
 
 def generate_time_slots(start_time, end_time, interval_minutes, chosen_date=None, occupied_slots=[]):
@@ -180,57 +188,67 @@ def generate_time_slots(start_time, end_time, interval_minutes, chosen_date=None
 
 
 def check_email_exists(email):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE email = ?", (email,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    return db.email_exists(email)
 
 
 def check_phone_exists(phone):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE phone = ?", (phone,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    return db.phone_exists(phone)
 
 
 def responde(message):
+    with tracing.recorder.request('responde'):
+        return _responde(message)
+
+
+def _responde(message):
     bot_message = ""
-    if message.lower() in greetings:
+    symptoms = st.session_state['symptom_state']
+    st.session_state['evidence'] = []
+    with tracing.span('responde.intent'):
+        intent = router.route(message)
+
+    if intent == intent_router.GREETING:
         bot_message = random.choice(responses)
-    elif message.lower() in farewell:
+    elif intent == intent_router.FAREWELL:
         bot_message = random.choice(replies)
-    elif "appointment" in message.lower() or "book" in message.lower() or "schedule" in message.lower():
+    elif intent == intent_router.BOOKING:
         st.session_state['booking_appointment'] = True
         st.session_state['appointment_step'] = 1
+        st.session_state['offered_slots'] = []
+        if symptoms is not None:
+            symptoms.reset()
         bot_message = "Sure, I can help you with booking an appointment. What is your first name?"
     else:
         try:
-            transform_text = vectorizer.transform([message])
-            transform_text = torch.tensor(transform_text.toarray()).float()
-            model.eval()
-            with torch.no_grad():
-                y_logits = model(transform_text)
-                pred_prob = torch.softmax(y_logits, dim=1)
-                max_prob, pred_class = torch.max(pred_prob, dim=1)
-
-                if max_prob.item() < CONFIDENCE_THRESHOLD:
-                    bot_message = "Could you please provide more details about your symptoms? I need more information to understand them fully."
+            # After a low-confidence answer the next message adds to the symptoms already described.
+            with tracing.span('responde.predict'):
+                if symptoms is not None and len(symptoms):
+                    symptoms.add(message)
+                    pred_class, max_prob = symptoms.predict()
                 else:
-                    test_pred = names.get(pred_class.item(), "Not Found")
-                    st.session_state['predicted_disease'] = test_pred
-                    if test_pred == "Not Found":
-                        bot_message = "No diagnose available"
+                    pred_class, max_prob = cache.predict(message, batcher.predict, artifact_id=context.artifact_id)
+
+            if max_prob < CONFIDENCE_THRESHOLD:
+                if symptoms is not None and not len(symptoms):
+                    symptoms.add(message)
+                bot_message = "Could you please provide more details about your symptoms? I need more information to understand them fully."
+            else:
+                with tracing.span('responde.advice'):
+                    label = labels[pred_class]
+                    st.session_state['predicted_disease'] = label.name
+                    # Advice is ranked against everything the user described since the last diagnosis.
+                    if symptoms is not None and len(symptoms):
+                        query = context.featurizer.transform_counts([symptoms.counts])
                     else:
-                        advice_list = health_advice.get(test_pred, ["No advice available"])
-                        if advice_list == ["No advice available"]:
-                            advice = advice_list[0]
-                        else:
-                            advice = random.choice(advice_list)  # Select a random piece of advice
-                        bot_message = f'Given your symptoms, it seems likely that you might have {test_pred}. {advice}'
+                        query = context.featurizer.transform([message])
+                    advice = context.advice_index.choose(pred_class, query)
+                    bot_message = f'Given your symptoms, it seems likely that you might have {label.name}. {advice}'
+                if EVIDENCE_EXAMPLES and context.evidence_index is not None:
+                    # The closest training examples, so a clinician can check what the prediction rests on.
+                    with tracing.span('responde.evidence'):
+                        st.session_state['evidence'] = context.evidence_index.nearest(query, EVIDENCE_EXAMPLES)
+                if symptoms is not None:
+                    symptoms.reset()
         except Exception as e:
             print(f"Error: {e}")  # Print the actual error for debugging
             bot_message = "I encountered an error while processing your request. Please try again."
@@ -246,7 +264,21 @@ def send_verification_email(first_name, last_name, email, phone, date, time, doc
         print(f"Debug: Error sending email - {e}")
 
 
+def offer_next_slots(doctors, first_date=None):
+    # The earliest free appointments with these doctors from first_date on (today by default), so the patient
+    # can book one without going through the date, doctor and time pickers. Returns them as a numbered list.
+    with tracing.span('booking.next_slots'):
+        offers = availability.next_free_slots(doctors, NEXT_SLOTS_COUNT, NEXT_SLOTS_DAYS, first_date=first_date)
+    st.session_state['offered_slots'] = offers
+    return "; ".join(f"{i}) {doctor} on {date} at {time}" for i, (date, time, doctor) in enumerate(offers, 1))
+
+
 def handle_booking_conversation(user_input):
+    with tracing.recorder.request(f"booking.step{st.session_state['appointment_step']}"):
+        return _handle_booking_step(user_input)
+
+
+def _handle_booking_step(user_input):
     step = st.session_state['appointment_step']
     details = st.session_state['appointment_details']
     print(f"Debug: Entered handle_booking_conversation with step {step} and user_input {user_input}")
@@ -285,9 +317,24 @@ def handle_booking_conversation(user_input):
             return "An appointment with this phone number already exists. Please provide a different phone number."
         details['phone'] = user_input
         st.session_state['appointment_step'] = 5
+        predicted_disease = st.session_state.get('predicted_disease')
+        listing = offer_next_slots(book_appointment.doctors_for_condition(predicted_disease))
+        if listing:
+            return (f"Thanks! The earliest free appointments for {predicted_disease} are: {listing}. "
+                    "Reply with the number of one to book it, or choose a date for the appointment.")
         return "Thanks! Please choose a date for the appointment."
 
     elif step == 5:
+        offers = st.session_state['offered_slots']
+        choice = user_input.strip()
+        if offers and choice.isdigit() and 1 <= int(choice) <= len(offers):
+            # An offered slot fills in the date, doctor and time at once; step 7 then reserves it.
+            details['date'], time_str, details['doctor'] = offers[int(choice) - 1]
+            st.session_state['offered_slots'] = []
+            st.session_state['selected_time'] = time_str
+            st.session_state['appointment_step'] = 7
+            return _handle_booking_step(time_str)
+
         if 'chosen_date' not in st.session_state or st.session_state['chosen_date'] is None:
             return "Please choose a date for the appointment using the calendar."
 
@@ -297,12 +344,22 @@ def handle_booking_conversation(user_input):
             return "The chosen date is in the past. Please provide a valid date (YYYY-MM-DD):"
 
         details['date'] = date_str
+        st.session_state['offered_slots'] = []
         st.session_state['appointment_step'] = 6
         st.session_state['chosen_date'] = None
         return "Please choose a doctor from the options below."
 
     elif step == 6:
         details['doctor'] = user_input
+        if not availability.cache.free_times(details['date'], user_input):
+            st.session_state['appointment_step'] = 5
+            # Searched from the chosen date, so nothing earlier than what the patient asked for is offered.
+            listing = offer_next_slots([user_input], first_date=details['date'])
+            if listing:
+                return (f"{user_input} has no free time on {details['date']}. The next free appointments are: "
+                        f"{listing}. Reply with the number of one to book it, or choose another date.")
+            return (f"{user_input} has no free time in the {NEXT_SLOTS_DAYS} days from {details['date']}. "
+                    "Please choose another date and doctor.")
         st.session_state['appointment_step'] = 7
         return "Please select a time for the appointment from the options below."
 
@@ -321,7 +378,9 @@ def handle_booking_conversation(user_input):
             print(f"Debug: Validation failed for datetime {date_str} {time_str}")
             return "The chosen date and time are not available. Please select a valid time (HH:MM):"
 
-        if not is_time_slot_available(date_str, time_str, doctor):
+        with tracing.span('booking.slot_check'):
+            available = is_time_slot_available(date_str, time_str, doctor)
+        if not available:
             print(f"Debug: Time slot {date_str} {time_str} not available for doctor {doctor}")
             return "The chosen time slot is already booked for the selected doctor. Please select a different time: "
 
@@ -333,23 +392,19 @@ def handle_booking_conversation(user_input):
         details['appointment_number'] = appointment_number
 
         try:
-            conn = sqlite3.connect('data/appointments.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO appointments (first_name, last_name, email, phone, date, time, doctor, appointment_number) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                details['first_name'], details['last_name'], details['email'], details['phone'], details['date'],
-                details['time'], details['doctor'], details['appointment_number']))
-            conn.commit()
-            conn.close()
+            with tracing.span('booking.insert'):
+                db.reserve_appointment(details['appointment_number'], details['first_name'], details['last_name'],
+                                       details['email'], details['phone'], details['date'], details['time'],
+                                       details['doctor'])
+            availability.cache.invalidate(details['date'], details['doctor'])
             st.session_state['appointment_details'] = {}
 
             print("Debug: Calling send_verification_email")
-            email_sent = book_appointment.send_verification_email(details['first_name'], details['last_name'],
-                                                                  details['email'],
-                                                                  details['phone'], details['date'], details['time'],
-                                                                  details['doctor'], details['appointment_number'])
+            with tracing.span('booking.email'):
+                email_sent = book_appointment.send_verification_email(details['first_name'], details['last_name'],
+                                                                      details['email'],
+                                                                      details['phone'], details['date'], details['time'],
+                                                                      details['doctor'], details['appointment_number'])
             print(f"Debug: email_sent returned: {email_sent}")
 
             if email_sent:
@@ -357,6 +412,14 @@ def handle_booking_conversation(user_input):
             else:
                 return "Your appointment has been booked, but we couldn't send the confirmation email. Please contact support."
 
+        except db.SlotTaken:
+            # Another session booked the slot between the availability check and the insert.
+            print(f"Debug: Time slot {date_str} {time_str} was taken for doctor {doctor} before the insert")
+            availability.cache.invalidate(date_str, doctor)
+            details.pop('time', None)
+            st.session_state['appointment_step'] = 7
+            st.session_state['booking_appointment'] = True
+            return "The chosen time slot is already booked for the selected doctor. Please select a different time: "
         except Exception as e:
             print(f"Debug: Database error occurred: {e}")
             return f"An error occurred while booking the appointment: {e}"
@@ -368,6 +431,11 @@ def handle_time_selection(time):
     st.session_state.chat_history.append((f" selected time {time}", reply))
 
 
+def handle_offer_selection(number):
+    reply = handle_booking_conversation(str(number))
+    st.session_state.chat_history.append((f" selected appointment {number}", reply))
+
+
 def handle_doctor_selection(doctor):
     reply = handle_booking_conversation(doctor)
     st.session_state.chat_history.append((f" selected doctor {doctor}", reply))
@@ -417,10 +485,21 @@ def main():
                 </div>
                 """, unsafe_allow_html=True)
 
+            if st.session_state.get('evidence'):
+                with st.expander("Similar cases from the training data"):
+                    for text, label, score in st.session_state['evidence']:
+                        st.caption(f"{label} (similarity {score:.2f}): {text}")
+
             if st.session_state['booking_appointment']:
                 step = st.session_state['appointment_step']
 
                 if step == 5:
+                    offers = st.session_state['offered_slots']
+                    if offers:
+                        cols = st.columns(len(offers))
+                        for i, (date, time, doctor) in enumerate(offers):
+                            cols[i].button(f"{i + 1}) {date} {time}, {doctor}", key=f"offer_button_{i}",
+                                           on_click=lambda n=i + 1: handle_offer_selection(n))
                     min_date = datetime.now().date()
                     date_input = st.date_input("Choose a date for the appointment", value=None, min_value=min_date)
                     if date_input:
@@ -440,8 +519,7 @@ def main():
                 elif step == 7:
                     doctor = st.session_state['appointment_details']['doctor']
                     date = st.session_state['appointment_details']['date']
-                    occupied_slots = get_occupied_time_slots(date, doctor)
-                    time_slots = generate_time_slots("07:00", "20:30", 30, date, occupied_slots)
+                    time_slots = availability.cache.slots(date, doctor)
                     selected_time = None
                     cols = st.columns(4)
                     for i, (time, occupied) in enumerate(time_slots):
@@ -459,6 +537,38 @@ def main():
             st.subheader("About")
             st.write(
                 "This chatbot helps with preliminary medical advice and can guide you to the appropriate healthcare resources.")
+            st.caption(f"Model loaded in {context.build_seconds:.2f}s (warmup {context.warmup_seconds * 1000:.1f}ms).")
+            batch_stats = batcher.stats()
+            st.caption(f"Inference batches: {batch_stats['batches']}, mean batch size "
+                       f"{batch_stats['mean_batch_size']:.2f} ({batch_stats['immediate_batches']} sent without waiting), "
+                       f"queue depth {batch_stats['queue_depth']}.")
+            cache_stats = cache.stats()
+            st.caption(f"Prediction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                       f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries.")
+            slot_stats = availability.cache.stats()
+            st.caption(f"Availability cache: {slot_stats['hits']} hits, {slot_stats['misses']} misses "
+                       f"({slot_stats['hit_rate']:.0%}), {slot_stats['entries']} doctor-days, "
+                       f"{slot_stats['invalidations']} invalidations.")
+            if hasattr(context.engine, 'combine'):
+                ensemble_stats = context.engine.stats()
+                budget = (f"{ensemble_stats['cut_short_rows']} rows cut short by the "
+                          f"{ensemble_stats['budget_ms']:g}ms budget" if ensemble_stats['budget_ms'] is not None
+                          else "no time budget")
+                consulted = ', '.join(f'{name} {count}' for name, count in ensemble_stats['consulted_rows'].items())
+                st.caption(f"Ensemble fallback: {ensemble_stats['fallback_rows']} of {ensemble_stats['rows']} "
+                           f"rows re-scored (rows per backend: {consulted or 'none'}), {budget}.")
+            span_stats = tracing.recorder.stats()
+            if span_stats:
+                st.caption("Stage latency over the last requests (ms):")
+                st.table([{'stage': name, 'count': stats['count'], 'p50': round(stats['p50_ms'], 3),
+                           'p95': round(stats['p95_ms'], 3), 'p99': round(stats['p99_ms'], 3)}
+                          for name, stats in span_stats.items()])
+            skipped = tracing.recorder.skipped_profiles()
+            if skipped:
+                st.caption(f"{skipped} sampled requests were not profiled because another profile was running.")
+            for profile in reversed(tracing.recorder.profiles()):
+                with st.expander(f"Profile of {profile['name']} ({profile['seconds'] * 1000:.1f}ms)"):
+                    st.code(profile['report'])
 
 
 if __name__ == "__main__":
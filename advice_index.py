@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+import scipy.sparse as sp
+
+import label_table
+
+ADVICE_PREFIX = 'advice/'
+TOP_K = 3
+
+
+def advice_corpus(names, advice, aliases=label_table.ALIASES):
+    # Healthguide.py repeats many strings across conditions, so each distinct string is stored once.
+    # Class c owns the corpus rows rows[offsets[c]:offsets[c + 1]], in Healthguide.py order.
+    texts = {}
+    rows = []
+    offsets = [0]
+    for class_id in sorted(names):
+        key = label_table.resolve(names[class_id], advice, 'health_advice', aliases)
+        if key is None:
+            raise ValueError(f"Label {class_id}:{names[class_id]} has no health_advice entry")
+        rows += [texts.setdefault(text, len(texts)) for text in dict.fromkeys(advice[key])]
+        offsets.append(len(rows))
+    return list(texts), rows, offsets
+
+
+def build_arrays(vectorizer, names, advice):
+    # Run once when the bundle is exported: the advice corpus in the symptom vectorizer's TF-IDF space,
+    # so the stored rows are l2-normalised like the query rows and a dot product is their cosine.
+    texts, rows, offsets = advice_corpus(names, advice)
+    matrix = vectorizer.transform(texts).tocsr()
+    return {
+        ADVICE_PREFIX + 'texts': np.array(texts, dtype=str),
+        ADVICE_PREFIX + 'rows': np.array(rows, dtype=np.int64),
+        ADVICE_PREFIX + 'offsets': np.array(offsets, dtype=np.int64),
+        ADVICE_PREFIX + 'data': matrix.data.astype(np.float64),
+        ADVICE_PREFIX + 'indices': matrix.indices.astype(np.int32),
+        ADVICE_PREFIX + 'indptr': matrix.indptr.astype(np.int64),
+    }
+
+
+class AdviceIndex:
+    def __init__(self, texts, rows, offsets, matrix, top_k=TOP_K, rng=None):
+        self.n_features = matrix.shape[1]
+        self.top_k = max(1, int(top_k))
+        self.rng = rng or random.Random()
+        # One CSR block and text list per class, gathered here so a reply does no row selection of its own.
+        self.texts = [[texts[row] for row in rows[start:end]] for start, end in zip(offsets, offsets[1:])]
+        self.blocks = [matrix[rows[start:end]] for start, end in zip(offsets, offsets[1:])]
+
+    @classmethod
+    def from_arrays(cls, arrays, n_features, **kwargs):
+        texts = arrays[ADVICE_PREFIX + 'texts'].tolist()
+        matrix = sp.csr_matrix((arrays[ADVICE_PREFIX + 'data'], arrays[ADVICE_PREFIX + 'indices'],
+                                arrays[ADVICE_PREFIX + 'indptr']), shape=(len(texts), n_features))
+        return cls(texts, arrays[ADVICE_PREFIX + 'rows'].tolist(), arrays[ADVICE_PREFIX + 'offsets'].tolist(),
+                   matrix, **kwargs)
+
+    @classmethod
+    def build(cls, vectorizer, names, advice, **kwargs):
+        arrays = build_arrays(vectorizer, names, advice)
+        return cls.from_arrays(arrays, len(vectorizer.vocabulary_), **kwargs)
+
+    def scores(self, class_id, query):
+        # query is a 1 x n_features TF-IDF row; scattering it into a dense vector keeps this a single
+        # CSR mat-vec over the class's advice rows.
+        dense = np.zeros(self.n_features)
+        dense[query.indices] = query.data
+        return self.blocks[class_id] @ dense
+
+    def rank(self, class_id, query):
+        scores = self.scores(class_id, query)
+        texts = self.texts[class_id]
+        return [(texts[i], float(scores[i])) for i in np.argsort(-scores, kind='stable')]
+
+    def choose(self, class_id, query):
+        # Sample among the top_k most similar strings so repeated questions still get varied replies.
+        # A message that shares no term with any of them falls back to the whole list.
+        scores = self.scores(class_id, query)
+        texts = self.texts[class_id]
+        if not scores.any():
+            return self.rng.choice(texts)
+        k = min(self.top_k, int(np.count_nonzero(scores)))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return texts[int(self.rng.choice(top))]
@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import advice_index
+import classifiers
+import evidence_index
+from app.tipo import nltk_utils
+
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_PATH = 'modelo/inference_bundle.npz'
+STATE_PREFIX = 'state/'
+
+
+def content_hash(arrays):
+    digest = hashlib.sha256()
+    for key in sorted(arrays):
+        value = np.ascontiguousarray(arrays[key])
+        digest.update(key.encode('utf-8'))
+        digest.update(str(value.dtype).encode('utf-8'))
+        digest.update(str(value.shape).encode('utf-8'))
+        digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+class InferenceBundle:
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.sha256 = manifest['sha256']
+        self.vocabulary = {term: index for index, term in enumerate(arrays['vocabulary'].tolist())}
+        self.idf = arrays['idf']
+        self.stop_words = arrays['stop_words'].tolist()
+        self.names = dict(zip(arrays['label_ids'].tolist(), arrays['label_names'].tolist()))
+        self.state = {key[len(STATE_PREFIX):]: value for key, value in arrays.items()
+                      if key.startswith(STATE_PREFIX)}
+        # Bundles exported before the advice index was added load without it.
+        self.advice = {key: value for key, value in arrays.items()
+                       if key.startswith(advice_index.ADVICE_PREFIX)} or None
+        self.evidence = {key: value for key, value in arrays.items()
+                         if key.startswith(evidence_index.EVIDENCE_PREFIX)} or None
+        self.classifiers = {key: value for key, value in arrays.items()
+                            if key.startswith(classifiers.CLASSIFIER_PREFIX)} or None
+
+    @property
+    def input_dim(self):
+        return self.state['recurrent_layer.weight_ih_l0'].shape[1]
+
+    @property
+    def hidden_dim(self):
+        return self.state['recurrent_layer.weight_ih_l0'].shape[0]
+
+    @property
+    def output_dim(self):
+        return self.state['fc_layer.weight'].shape[0]
+
+    @property
+    def num_layers(self):
+        return sum(1 for key in self.state if key.startswith('recurrent_layer.weight_ih_l'))
+
+    def build_vectorizer(self):
+        settings = self.manifest['vectorizer']
+        vectorizer = nltk_utils.cria_tfidf_vector(stop_words=self.stop_words, vocabulary=self.vocabulary,
+                                                  **settings)
+        vectorizer.idf_ = self.idf
+        return vectorizer
+
+
+def export_bundle(vectorizer, state_dict, names, path=BUNDLE_PATH, activation='relu', advice=None,
+                  data_path=None):
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    label_ids = sorted(names)
+    arrays = {
+        'vocabulary': np.array(terms, dtype=str),
+        'idf': np.asarray(vectorizer.idf_, dtype=np.float64),
+        'stop_words': np.array(list(vectorizer.stop_words or []), dtype=str),
+        'label_ids': np.array(label_ids, dtype=np.int64),
+        'label_names': np.array([names[i] for i in label_ids], dtype=str),
+    }
+    if advice is None:
+        from data.Healthguide import health_advice as advice
+    arrays.update(advice_index.build_arrays(vectorizer, names, advice))
+    if data_path:
+        arrays.update(evidence_index.build_arrays(vectorizer, data_path))
+        arrays.update(classifiers.build_arrays(vectorizer, names, data_path))
+    for key, value in state_dict.items():
+        if hasattr(value, 'detach'):
+            value = value.detach().cpu().numpy()
+        arrays[STATE_PREFIX + key] = np.asarray(value)
+
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'sha256': content_hash(arrays),
+        'input_dim': len(terms),
+        'activation': activation,
+        'vectorizer': {
+            'lowercase': vectorizer.lowercase,
+            'norm': vectorizer.norm,
+            'use_idf': vectorizer.use_idf,
+            'smooth_idf': vectorizer.smooth_idf,
+            'sublinear_tf': vectorizer.sublinear_tf,
+        },
+    }
+    arrays['manifest'] = np.array(json.dumps(manifest))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_bundle(path=BUNDLE_PATH):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+
+    manifest = json.loads(arrays.pop('manifest').item())
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format version {manifest.get('format_version')} in {path}, "
+                         f"expected {BUNDLE_FORMAT_VERSION}. Re-export the bundle.")
+    if content_hash(arrays) != manifest['sha256']:
+        raise ValueError(f"Bundle {path} is corrupted: content hash does not match its manifest.")
+
+    bundle = InferenceBundle(manifest, arrays)
+    if len(bundle.vocabulary) != bundle.input_dim:
+        raise ValueError(f"Bundle {path} has a vocabulary of {len(bundle.vocabulary)} terms "
+                         f"but the model expects input_dim={bundle.input_dim}.")
+    if len(bundle.idf) != len(bundle.vocabulary):
+        raise ValueError(f"Bundle {path} has {len(bundle.idf)} IDF weights for "
+                         f"{len(bundle.vocabulary)} vocabulary terms.")
+    return bundle
+
+
+def main():
+    import inference
+
+    parser = argparse.ArgumentParser(description="Export the fitted vectorizer, label map and model weights "
+                                                 "into a single inference bundle.")
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--model', default=inference.MODEL_PATH)
+    parser.add_argument('--names', default=inference.NAMES_PATH)
+    parser.add_argument('--output', default=BUNDLE_PATH)
+    args = parser.parse_args()
+
+    context = inference.build_inference_context(data_path=args.data, model_path=args.model,
+                                                names_path=args.names, bundle_path=None)
+    manifest = export_bundle(context.vectorizer, context.engine.model.state_dict(), context.names, args.output,
+                             data_path=args.data)
+    print(f"Bundle written to {args.output} (format v{manifest['format_version']}, "
+          f"sha256 {manifest['sha256'][:12]}, {manifest['input_dim']} terms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import db
+
+# The bookable half-hour slots, 07:00 to 20:30. Bit i of a doctor-day bitmap is set when SLOT_TIMES[i] is taken.
+SLOT_TIMES = tuple(f"{hour:02d}:{minute:02d}" for hour in range(7, 21) for minute in (0, 30))
+SLOT_INDEX = {slot: i for i, slot in enumerate(SLOT_TIMES)}
+ALL_SLOTS = (1 << len(SLOT_TIMES)) - 1
+FIRST_SLOT_SECONDS = 7 * 3600
+SLOT_SECONDS = 1800
+
+
+def to_bitmap(times):
+    bits = 0
+    for slot in times:
+        index = SLOT_INDEX.get(slot)
+        if index is not None:
+            bits |= 1 << index
+    return bits
+
+
+def first_future_slot(date_str, now=None):
+    # Index of the first slot that is still ahead of `now` on date_str; dates compare as ISO strings.
+    now = now or datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    if date_str > today:
+        return 0
+    if date_str < today:
+        return len(SLOT_TIMES)
+    seconds = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+    index = int((seconds - FIRST_SLOT_SECONDS) // SLOT_SECONDS) + 1
+    return min(len(SLOT_TIMES), max(0, index))
+
+
+def next_free_slots(doctors, count, days, now=None, first_date=None, chunk_days=7, load_full=db.full_days,
+                    occupied=None):
+    # The first `count` free (date, time, doctor) in the `days` days from first_date ("%Y-%m-%d", today when
+    # None or already past), earliest first and, at the same time, in the order of `doctors`. Each week costs
+    # one query that names the fully booked doctor-days; only the days with room are read, through the
+    # availability cache, and the search stops as soon as it has enough slots.
+    doctors = list(dict.fromkeys(doctors))
+    if not doctors or count <= 0 or days <= 0:
+        return []
+    now = now or datetime.now()
+    occupied = occupied or cache.occupied
+    chunk_days = max(1, chunk_days)
+    start_date = now.date()
+    if first_date is not None:
+        start_date = max(start_date, datetime.strptime(first_date, "%Y-%m-%d").date())
+    dates = [(start_date + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days)]
+
+    found = []
+    for start in range(0, days, chunk_days):
+        chunk = dates[start:start + chunk_days]
+        full = load_full(doctors, chunk[0], chunk[-1], SLOT_TIMES)
+        for date_str in chunk:
+            future = ALL_SLOTS & ~((1 << first_future_slot(date_str, now)) - 1)
+            if not future:
+                continue
+            free = [0 if (doctor, date_str) in full else future & ~occupied(date_str, doctor)
+                    for doctor in doctors]
+            pending = 0
+            for mask in free:
+                pending |= mask
+            while pending:
+                index = (pending & -pending).bit_length() - 1
+                pending &= pending - 1
+                for doctor, mask in zip(doctors, free):
+                    if mask >> index & 1:
+                        found.append((date_str, SLOT_TIMES[index], doctor))
+                        if len(found) == count:
+                            return found
+    return found
+
+
+class AvailabilityCache:
+    # Occupied slots per (date, doctor) as a 28-bit int, read from the database on first use. Writers in this
+    # process call invalidate() after they commit; the TTL bounds how long a booking made by another process
+    # can go unseen, and the unique slot index still rejects it at reservation time.
+    def __init__(self, load, max_entries=4096, ttl_seconds=30.0, clock=time.monotonic):
+        self.load = load
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def occupied(self, date_str, doctor):
+        key = (date_str, doctor)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            version = self._version
+
+        bits = to_bitmap(self.load(date_str, doctor))
+        with self._lock:
+            # An invalidation while the load ran may have been for this key, so the result is not kept.
+            if version == self._version:
+                self._entries[key] = (bits, self.clock() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return bits
+
+    def slots(self, date_str, doctor, now=None):
+        # The time-slot grid: (time, occupied) for every slot still ahead of now.
+        bits = self.occupied(date_str, doctor)
+        return [(SLOT_TIMES[i], bool(bits >> i & 1))
+                for i in range(first_future_slot(date_str, now), len(SLOT_TIMES))]
+
+    def free_times(self, date_str, doctor, now=None):
+        bits = self.occupied(date_str, doctor)
+        return [SLOT_TIMES[i] for i in range(first_future_slot(date_str, now), len(SLOT_TIMES))
+                if not bits >> i & 1]
+
+    def invalidate(self, date_str, doctor):
+        with self._lock:
+            self._entries.pop((date_str, doctor), None)
+            self._version += 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+cache = AvailabilityCache(db.occupied_times,
+                          max_entries=int(os.getenv('AVAILABILITY_CACHE_MAX_ENTRIES', '4096')),
+                          ttl_seconds=float(os.getenv('AVAILABILITY_CACHE_TTL_SECONDS', '30')))
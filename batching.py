@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import tracing
+
+
+class MicroBatcher:
+    def __init__(self, context, max_batch_size=32, max_wait_ms=5.0, timeout_ms=10000.0):
+        self.context = context
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout = max(0.001, float(timeout_ms) / 1000.0)
+        self._failure = None
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._max_queue_depth = 0
+        self._last_batch_size = 0
+        self._immediate_batches = 0
+        self._worker = threading.Thread(target=self._run, name='inference-microbatcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, message):
+        if self._failure is not None:
+            raise self._failure
+        future = Future()
+        # A request sampled for profiling also gets the batch it lands in added to its profile.
+        self._queue.put((message, future, tracing.recorder.active_request()))
+        if self._failure is not None:
+            # The worker stopped between the check above and the put; nobody else will drain the queue.
+            self._drain()
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return future
+
+    def predict(self, message, timeout=None):
+        # Never waits forever: a stuck or dead worker surfaces as an error in the caller's rerun.
+        future = self.submit(message)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+
+    def _fail(self, future):
+        try:
+            future.set_exception(self._failure)
+        except InvalidStateError:
+            pass
+
+    def _drain(self):
+        while True:
+            try:
+                _, future, _ = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._fail(future)
+
+    def _collect(self, batch):
+        # Adaptive window: a request that finds nothing queued behind it, after a batch that was also alone, is
+        # sent at once, so a single session never pays max_wait. The window only opens once requests overlap.
+        # Fills `batch` in place, so the requests are never only in a local should the worker die here.
+        batch.clear()
+        batch.append(self._queue.get())
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(batch) == 1 and self._last_batch_size <= 1:
+            self._last_batch_size = 1
+            with self._stats_lock:
+                self._immediate_batches += 1
+            return
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._last_batch_size = len(batch)
+
+    def _run(self):
+        batch = []
+        try:
+            self._serve(batch)
+        except BaseException as e:
+            # Whatever stopped the worker, no caller is left waiting on a future it will never complete.
+            self._failure = RuntimeError(f"Inference batcher stopped: {e!r}")
+            print(f"Error: {self._failure}")
+            for _, future, _ in batch:
+                self._fail(future)
+            self._drain()
+            raise
+
+    def _serve(self, batch):
+        while True:
+            # Requests whose caller gave up waiting were cancelled and are dropped.
+            self._collect(batch)
+            batch[:] = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+            try:
+                with tracing.recorder.profile_for([request for _, _, request in batch]):
+                    with tracing.span('batcher.batch'):
+                        pred_probs = self.context.predict_proba([message for message, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), pred_prob in zip(batch, pred_probs):
+                pred_class = int(pred_prob.argmax())
+                future.set_result((pred_class, float(pred_prob[pred_class])))
+
+    def stats(self):
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            batched = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'requests': self._requests,
+                'batches': batches,
+                'immediate_batches': self._immediate_batches,
+                'mean_batch_size': batched / batches if batches else 0.0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'alive': self._failure is None,
+            }
@@ -0,0 +1,68 @@
+import argparse
+import random
+
+import common
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+import advice_index
+import inference
+from data.Healthguide import health_advice
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time relevance-ranked advice against random choice.")
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    context = inference.get_inference_context()
+    index = context.advice_index
+    texts, corpus_rows, offsets = advice_index.advice_corpus(context.names, health_advice)
+    total = sum(len(advice) for advice in health_advice.values())
+    print(f"{len(texts)} distinct advice strings ({total} in Healthguide.py) over {len(offsets) - 1} classes")
+
+    _, test_data = inference.load_dataset()
+    messages = test_data['text'].tolist()
+    queries = context.featurizer.transform(messages)
+    predictions = context.predict_proba(messages).argmax(axis=1)
+
+    # The mat-vec must agree with sklearn's cosine over a freshly vectorized advice corpus.
+    reference = context.vectorizer.transform(texts)
+    worst = 0.0
+    for row, class_id in enumerate(predictions[:200]):
+        class_rows = corpus_rows[offsets[class_id]:offsets[class_id + 1]]
+        expected = cosine_similarity(reference[class_rows], queries[row]).ravel()
+        worst = max(worst, float(np.abs(index.scores(class_id, queries[row]) - expected).max()))
+    print(f"Max |index - sklearn cosine| over 200 messages: {worst:.2e}")
+    if worst > 1e-9:
+        raise SystemExit("Advice scores do not match sklearn cosine similarity")
+
+    matched = sum(bool(index.scores(class_id, queries[row]).any()) for row, class_id in enumerate(predictions))
+    print(f"{matched}/{len(messages)} hold-out messages share a term with their condition's advice")
+    label = context.names[int(predictions[0])]
+    print(f"Example: {messages[0][:80]!r} -> {label}")
+    for text, score in index.rank(int(predictions[0]), queries[0])[:3]:
+        print(f"  {score:.3f}  {text[:100]}")
+
+    rng = random.Random(0)
+    query_rows = [queries[row] for row in range(len(messages))]
+
+    def random_choice(row, class_id):
+        return rng.choice(index.texts[class_id])
+
+    def ranked_choice(row, class_id):
+        return index.choose(class_id, query_rows[row])
+
+    def ranked_with_transform(row, class_id):
+        return index.choose(class_id, context.featurizer.transform([messages[row]]))
+
+    results = {}
+    for name, choose in (('random.choice', random_choice), ('ranked choose (row given)', ranked_choice),
+                         ('ranked choose + featurize', ranked_with_transform)):
+        rows = iter(list(enumerate(predictions)) * (args.iterations // len(messages) + 2))
+        results[name] = common.measure(lambda: choose(*next(rows)), args.iterations)
+    common.print_results("Advice selection per reply", results)
+
+
+if __name__ == "__main__":
+    main()
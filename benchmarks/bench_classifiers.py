@@ -0,0 +1,56 @@
+import argparse
+
+import common
+import numpy as np
+
+import classifiers
+import inference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hold-out accuracy and per-message latency of each classifier "
+                                                 "backend and of the low-confidence ensemble.")
+    parser.add_argument('--iterations', type=int, default=1000)
+    # No time budget by default, so the accuracy columns do not depend on the machine's load.
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help=f"Ensemble time budget (the app uses {classifiers.ENSEMBLE_BUDGET_MS:g}).")
+    args = parser.parse_args()
+
+    context = inference.build_inference_context(ensemble=classifiers.BACKENDS, ensemble_budget_ms=args.budget_ms)
+    ensemble = context.engine
+    _, test_data = inference.load_dataset()
+    class_ids = {name: class_id for class_id, name in context.names.items()}
+    labels = test_data['label'].map(class_ids).to_numpy()
+    matrix = context.featurizer.transform(test_data['text'].tolist())
+    rows = [matrix[i] for i in range(matrix.shape[0])]
+
+    backends = [('rnn (torch)', ensemble.primary)]
+    backends += [(backend.name, backend) for backend in ensemble.secondaries]
+    backends += [('ensemble', ensemble)]
+    unsure = ensemble.primary.predict_proba(matrix).max(axis=1) < inference.CONFIDENCE_THRESHOLD
+    print(f"{len(labels)} hold-out messages, {int(unsure.sum())} under the {inference.CONFIDENCE_THRESHOLD} threshold "
+          f"for the RNN")
+    print(f"  {'backend':<14} {'accuracy':>9} {'answered':>9} {'correct':>8} "
+          f"{'unsure rows: answered':>22} {'correct':>8}")
+    for name, backend in backends:
+        pred_probs = backend.predict_proba(matrix)
+        correct = pred_probs.argmax(axis=1) == labels
+        answered = pred_probs.max(axis=1) >= inference.CONFIDENCE_THRESHOLD
+        print(f"  {name:<14} {correct.mean():>9.3f} {int(answered.sum()):>9} {int((correct & answered).sum()):>8} "
+              f"{int((answered & unsure).sum()):>22} {int((correct & answered & unsure).sum()):>8}")
+
+    results = {}
+    for name, backend in backends:
+        batch = iter(rows * (args.iterations // len(rows) + 2))
+        results[f'{name}, hold-out'] = common.measure(lambda: backend.predict_proba(next(batch)), args.iterations)
+    unsure_rows = [row for row, flag in zip(rows, unsure) if flag]
+    if unsure_rows:
+        batch = iter(unsure_rows * (args.iterations // len(unsure_rows) + 2))
+        results['ensemble, unsure rows only'] = common.measure(lambda: ensemble.predict_proba(next(batch)),
+                                                               args.iterations)
+    common.print_results("Per-message prediction", results)
+    print(f"Ensemble: {ensemble.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import common
+
+import db
+
+SLOT_TIMES = [f"{hour:02d}:{minute:02d}" for hour in range(7, 21) for minute in (0, 30)]
+DOCTORS = [f"Dr. Bench {i} - General Physician" for i in range(24)]
+
+
+class PerCallConnections:
+    # The access pattern before db.py: every helper opens its own connection in the default rollback
+    # journal mode and closes it again.
+    def __init__(self, path):
+        self.path = path
+
+    def _query(self, sql, params):
+        conn = sqlite3.connect(self.path)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def email_exists(self, email):
+        return bool(self._query(db.EMAIL_EXISTS, (email,)))
+
+    def phone_exists(self, phone):
+        return bool(self._query(db.PHONE_EXISTS, (phone,)))
+
+    def occupied_times(self, day, doctor):
+        return [row[0] for row in self._query(db.OCCUPIED_TIMES, (day, doctor))]
+
+    def slot_available(self, day, time, doctor):
+        return not self._query(db.SLOT_TAKEN, (day, time, doctor))
+
+    def reserve_appointment(self, *values):
+        conn = sqlite3.connect(self.path)
+        cursor = conn.cursor()
+        cursor.execute(db.INSERT_APPOINTMENT, values)
+        conn.commit()
+        conn.close()
+
+
+def seed(path, rows, wal):
+    conn = sqlite3.connect(path)
+    if wal:
+        conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(db.SCHEMA)
+    first_day = date.today() + timedelta(days=1)
+    values = []
+    for i in range(rows):
+        slot, doctor_index = divmod(i, len(DOCTORS))
+        day, time_index = divmod(slot, len(SLOT_TIMES))
+        values.append((100000 + i % 900000, 'Test', 'Patient', f'patient{i}@example.com', f'{i:011d}',
+                       (first_day + timedelta(days=day)).isoformat(), SLOT_TIMES[time_index], DOCTORS[doctor_index]))
+    conn.executemany(db.INSERT_APPOINTMENT, values)
+    conn.commit()
+    conn.close()
+
+
+def run_sessions(store, sessions, flows, first_id):
+    # Each session thread runs the DB calls of `flows` booking conversations: the email and phone checks
+    # (steps 3-4), the time grid (step 6), and the slot check and insert (step 7).
+    samples = []
+    errors = []
+    samples_lock = threading.Lock()
+    far_day = date.today() + timedelta(days=3650)
+    barrier = threading.Barrier(sessions)
+
+    def session(worker):
+        local = []
+        barrier.wait()
+        for flow in range(flows):
+            n = first_id + worker * flows + flow
+            day = (far_day + timedelta(days=n // (len(SLOT_TIMES) * len(DOCTORS)))).isoformat()
+            doctor = DOCTORS[n % len(DOCTORS)]
+            slot = SLOT_TIMES[(n // len(DOCTORS)) % len(SLOT_TIMES)]
+            start = time.perf_counter()
+            try:
+                store.email_exists(f'bench{n}@example.com')
+                store.phone_exists(f'9{n:010d}')
+                store.occupied_times(day, doctor)
+                if store.slot_available(day, slot, doctor):
+                    store.reserve_appointment(123456, 'Bench', 'Patient', f'bench{n}@example.com', f'9{n:010d}',
+                                             day, slot, doctor)
+            except sqlite3.Error as e:
+                errors.append(e)
+                continue
+            local.append(time.perf_counter() - start)
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=session, args=(worker,)) for worker in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    stats = common.summarize(samples)
+    stats['ops_per_sec'] = len(samples) / wall if wall else 0.0
+    stats['errors'] = len(errors)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Booking-flow database time with a connection per call versus "
+                                                 "the pooled WAL connections in db.py, under concurrent sessions.")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--flows', type=int, default=100, help="Booking flows per session.")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    results = {}
+    for label, wal in (('per-call connect', False), ('db.py pool, WAL', True)):
+        path = os.path.join(workdir.name, f"{'wal' if wal else 'rollback'}.db")
+        seed(path, args.rows, wal)
+        if wal:
+            db.close_all()
+            db.DB_PATH = path
+            db.initialize()
+            store = db
+        else:
+            store = PerCallConnections(path)
+        first_id = 0
+        for sessions in args.sessions:
+            stats = run_sessions(store, sessions, args.flows, first_id)
+            first_id += sessions * args.flows
+            results[f'{label}, {sessions} sessions'] = stats
+            if stats['errors']:
+                print(f"{label}, {sessions} sessions: {stats['errors']} flows failed")
+    common.print_results(f"Booking-flow DB time per conversation ({args.rows} seeded rows, ops/s = flows/s)",
+                         results)
+
+
+if __name__ == "__main__":
+    main()
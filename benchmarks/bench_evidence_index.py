@@ -0,0 +1,79 @@
+import argparse
+import random
+
+import common
+import numpy as np
+import scipy.sparse as sp
+
+import evidence_index
+import inference
+
+
+def scaled_corpus(texts, labels, scale, seed=0):
+    # Copies after the first drop and reorder words, so the rows differ while keeping the real vocabulary
+    # and the number of terms per row.
+    rng = random.Random(seed)
+    out_texts, out_labels = list(texts), list(labels)
+    for _ in range(scale - 1):
+        for text, label in zip(texts, labels):
+            words = [word for word in text.split() if rng.random() > 0.2]
+            rng.shuffle(words)
+            out_texts.append(' '.join(words))
+            out_labels.append(label)
+    return out_texts, out_labels
+
+
+def brute_force(matrix, query, k):
+    dense = np.zeros(matrix.shape[1])
+    dense[query.indices] = query.data
+    scores = matrix @ dense
+    return np.sort(scores)[::-1][:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency of the evidence index as the corpus grows.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--budget-ms', type=float, default=5.0, help="p99 budget at the largest scale.")
+    args = parser.parse_args()
+
+    context = inference.get_inference_context()
+    texts, labels = evidence_index.load_examples(inference.DATA_PATH)
+    _, test_data = inference.load_dataset()
+    queries = [context.featurizer.transform([message]) for message in test_data['text']]
+
+    results = {}
+    for scale in args.scales:
+        corpus_texts, corpus_labels = scaled_corpus(texts, labels, scale)
+        matrix = context.featurizer.transform(corpus_texts)
+        index = evidence_index.EvidenceIndex(corpus_texts, corpus_labels, matrix)
+        stored = index.matrix
+        print(f"{scale}x: {len(index)} examples, {matrix.nnz} non-zeros, "
+              f"{(stored.data.nbytes + stored.indices.nbytes + stored.indptr.nbytes) / 1e6:.1f} MB")
+
+        for query in queries[:100]:
+            expected = brute_force(matrix, query, args.k)
+            got = np.array([score for _, _, score in index.nearest(query, args.k)])
+            # The index keeps float32 weights, so scores agree with the float64 brute force to ~1e-7.
+            if not np.allclose(got, expected[:len(got)], atol=1e-6) or (expected[len(got):] > 1e-6).any():
+                raise SystemExit(f"Evidence index disagrees with brute force at {scale}x")
+
+        rows = iter(queries * (args.iterations // len(queries) + 2))
+        results[f'{scale}x, nearest {args.k}'] = common.measure(lambda: index.nearest(next(rows), args.k),
+                                                                args.iterations)
+        if scale == max(args.scales):
+            brute_rows = iter(queries * (args.iterations // len(queries) + 2))
+            csr = sp.csr_matrix(matrix)
+            results[f'{scale}x, brute force CSR + sort'] = common.measure(
+                lambda: brute_force(csr, next(brute_rows), args.k), max(20, args.iterations // 10))
+    common.print_results("Evidence lookup", results)
+
+    largest = results[f'{max(args.scales)}x, nearest {args.k}']
+    verdict = "within" if largest['p99_ms'] <= args.budget_ms else "OVER"
+    print(f"p99 at {max(args.scales)}x: {largest['p99_ms']:.3f} ms, {verdict} the {args.budget_ms} ms budget")
+    print("Example neighbours:", *context.evidence_index.nearest(queries[0], args.k), sep="\n  ")
+
+
+if __name__ == "__main__":
+    main()
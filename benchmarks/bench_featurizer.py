@@ -0,0 +1,73 @@
+import argparse
+
+import common
+import numpy as np
+
+import featurizer
+import inference
+from app.tipo import nltk_utils
+
+SHORT_MESSAGES = ["I have a headache", "fever and cough", "my skin is itchy and red",
+                  "I have been vomiting since yesterday. My stomach hurts."]
+
+
+def same_rows(expected, actual):
+    return (expected.shape == actual.shape and expected.dtype == actual.dtype
+            and np.array_equal(expected.indptr, actual.indptr) and np.array_equal(expected.indices, actual.indices)
+            and np.array_equal(expected.data, actual.data))
+
+
+def check_parity(vectorizer, texts):
+    compiled = featurizer.CompiledFeaturizer.from_vectorizer(vectorizer)
+    batch_ok = same_rows(vectorizer.transform(texts), compiled.transform(texts))
+    mismatched = [text for text in texts if not same_rows(vectorizer.transform([text]), compiled.transform([text]))]
+    return batch_ok, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time the compiled featurizer against "
+                                                 "TfidfVectorizer.transform.")
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    train_data, test_data = inference.load_dataset(args.data)
+    texts = train_data['text'].tolist() + test_data['text'].tolist() + SHORT_MESSAGES + ["", "the and of"]
+
+    failed = False
+    vectorizers = {
+        'default': nltk_utils.cria_tfidf_vector(),
+        'no norm': nltk_utils.cria_tfidf_vector(norm=None),
+        'sublinear tf, no idf': nltk_utils.cria_tfidf_vector(sublinear_tf=True, use_idf=False),
+    }
+    for name, vectorizer in vectorizers.items():
+        vectorizer.fit(train_data['text'])
+        batch_ok, mismatched = check_parity(vectorizer, texts)
+        print(f"Parity ({name}): batch of {len(texts)} identical: {batch_ok}, "
+              f"single-row mismatches: {len(mismatched)}")
+        failed = failed or not batch_ok or bool(mismatched)
+    if failed:
+        raise SystemExit("Compiled featurizer does not reproduce TfidfVectorizer.transform")
+
+    vectorizer = vectorizers['default']
+    compiled = featurizer.CompiledFeaturizer.from_vectorizer(vectorizer)
+    context = inference.get_inference_context()
+    batch = test_data['text'].tolist()[:32]
+    results = {}
+    for message in (SHORT_MESSAGES[0], SHORT_MESSAGES[-1]):
+        label = f"{len(message.split())} words"
+        results[f'sklearn transform, {label}'] = common.measure(lambda: vectorizer.transform([message]),
+                                                                args.iterations)
+        results[f'compiled transform, {label}'] = common.measure(lambda: compiled.transform([message]),
+                                                                 args.iterations)
+    results[f'sklearn transform, batch of {len(batch)}'] = common.measure(
+        lambda: vectorizer.transform(batch), args.iterations // 10, ops_per_call=len(batch))
+    results[f'compiled transform, batch of {len(batch)}'] = common.measure(
+        lambda: compiled.transform(batch), args.iterations // 10, ops_per_call=len(batch))
+    results['context.predict (compiled), short'] = common.measure(lambda: context.predict(SHORT_MESSAGES[0]),
+                                                                  args.iterations)
+    common.print_results("Featurizer latency", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import common
+
+EMAIL_RE = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+SLOT_TIMES = [f"{minutes // 60:02d}:{minutes % 60:02d}" for minutes in range(7 * 60, 20 * 60 + 31, 30)]
+
+STARTUP_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+sys.path[:0] = {paths!r}
+import bench_hot_paths
+App = bench_hot_paths.import_app()
+App.responde("I have a headache and a fever")
+print(json.dumps({{'startup_s': time.perf_counter() - start}}))
+"""
+
+
+class SessionState(dict):
+    # Stand-in for st.session_state: App.py uses both item and attribute access.
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def import_app():
+    # App.py builds its resources and session keys at import time, so the stub has to be in place first.
+    import streamlit
+    import streamlit.logger
+    streamlit.logger.set_log_level('error')
+    streamlit.session_state = SessionState()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import App
+    # No DNS or SMTP round trips: only the code between them is timed.
+    App.is_valid_email = lambda email: re.match(EMAIL_RE, email) is not None
+    App.book_appointment.send_verification_email = lambda *args: True
+    return App
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def seed_appointments(App, db_path, rows, doctors, seed=0):
+    # Fill the calendar from tomorrow on, one appointment per slot, until there are `rows` of them.
+    App.db.close_all()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    App.db.DB_PATH = db_path
+    App.db.initialize()
+    App.availability.cache.clear()
+    first_day = date.today() + timedelta(days=1)
+    days = max(1, math.ceil(rows / (len(doctors) * len(SLOT_TIMES))))
+    rng = random.Random(seed)
+
+    def generate():
+        for i in range(rows):
+            slot, doctor_index = divmod(i, len(doctors))
+            day, time_index = divmod(slot, len(SLOT_TIMES))
+            yield (rng.randint(100000, 999999), 'Test', 'Patient', f'patient{i}@example.com', f'{i:011d}',
+                   (first_day + timedelta(days=day)).isoformat(), SLOT_TIMES[time_index], doctors[doctor_index])
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO appointments (appointment_number, first_name, last_name, email, phone, date, time, doctor)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', generate())
+    conn.commit()
+    conn.close()
+    return first_day, days
+
+
+def book(App, message, first_name, email, phone, day, doctor, slot):
+    session = App.st.session_state
+    session['booking_appointment'] = False
+    App.responde(message)
+    App.handle_booking_conversation(first_name)
+    App.handle_booking_conversation('Patient')
+    App.handle_booking_conversation(email)
+    App.handle_booking_conversation(phone)
+    session['chosen_date'] = day
+    App.handle_booking_conversation('')
+    App.handle_booking_conversation(doctor)
+    session['selected_time'] = slot
+    return App.handle_booking_conversation(slot)
+
+
+def measure_startup(db_path, runs):
+    samples = []
+    env = dict(os.environ, APPOINTMENTS_DB=db_path)
+    for _ in range(runs):
+        snippet = STARTUP_SNIPPET.format(paths=[os.path.dirname(os.path.abspath(__file__))] + sys.path[:2])
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', snippet], capture_output=True, text=True,
+                                check=True, env=env)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1])['startup_s'])
+    return common.summarize(samples)
+
+
+def compare(previous_path, report):
+    with open(previous_path) as file:
+        previous = json.load(file)
+    print(f"p50 change against {previous_path} (commit {previous.get('commit', '?')})")
+    for section, cases in report['results'].items():
+        for name, stats in cases.items():
+            old = previous.get('results', {}).get(section, {}).get(name)
+            if old and old['p50_ms']:
+                print(f"  {section + ': ' + name:<60} {old['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f} ms "
+                      f"({stats['p50_ms'] / old['p50_ms'] - 1:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput of the chat and booking hot paths in "
+                                                 "App.py, run outside Streamlit against a temporary database.")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--bookings', type=int, default=50, help="Full booking conversations per database size.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--startup-runs', type=int, default=3)
+    parser.add_argument('--output', default=None, help="JSON report path (default: bench_hot_paths-<commit>.json).")
+    parser.add_argument('--compare', default=None, help="Earlier JSON report to print p50 changes against.")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    db_path = os.path.join(workdir.name, 'appointments.db')
+    os.environ['APPOINTMENTS_DB'] = db_path
+    App = import_app()
+    import inference
+
+    _, test_data = inference.load_dataset()
+    messages = test_data['text'].tolist()
+    doctors = sorted(set(App.book_appointment.disease_to_doctor.values()))
+    session = App.st.session_state
+    symptoms = session['symptom_state']
+    results = {}
+
+    def fresh_reply(message):
+        # Every call goes through the model: empty cache, no symptoms carried over from the previous call.
+        App.cache.invalidate(App.context.artifact_id)
+        if symptoms is not None:
+            symptoms.reset()
+        return App.responde(message)
+
+    def cached_reply(message):
+        if symptoms is not None:
+            symptoms.reset()
+        return App.responde(message)
+
+    unseen = iter(messages * (args.iterations // len(messages) + 2))
+    lone = iter(messages * (args.iterations // len(messages) + 2))
+    repeated = iter(messages[:20] * (args.iterations // 20 + 2))
+    batch = messages[:args.batch_size]
+    results['inference'] = {
+        'responde, cache miss': common.measure(lambda: fresh_reply(next(unseen)), args.iterations),
+        'responde, cache hit': common.measure(lambda: cached_reply(next(repeated)), args.iterations),
+        'context.predict, 1 message': common.measure(lambda: App.context.predict(messages[0]), args.iterations),
+        # One session on an idle server: the batcher must not hold a lone request for its window.
+        'batcher.predict, lone request': common.measure(lambda: App.batcher.predict(next(lone)), args.iterations),
+        f'context.predict_proba, batch of {len(batch)}': common.measure(
+            lambda: App.context.predict_proba(batch), max(10, args.iterations // len(batch)),
+            ops_per_call=len(batch)),
+    }
+    common.print_results("Inference", results['inference'])
+
+    print("Measuring startup")
+    seed_appointments(App, db_path, 0, doctors)
+    results['startup'] = {
+        'cold (new process, import App, first reply)': measure_startup(db_path, args.startup_runs),
+        'warm (rebuild context in process)': common.measure(
+            lambda: inference.build_inference_context(names_path=App.file_path, engine='torch').predict(messages[0]),
+            args.startup_runs, warmup=0),
+    }
+    common.print_results("Startup", results['startup'])
+
+    for rows in args.rows:
+        start = time.perf_counter()
+        first_day, days = seed_appointments(App, db_path, rows, doctors)
+        print(f"Seeded {rows} appointments over {days} days in {time.perf_counter() - start:.1f}s")
+        rng = random.Random(rows)
+        lookups = [((first_day + timedelta(days=rng.randrange(days))).isoformat(), rng.choice(SLOT_TIMES),
+                    rng.choice(doctors)) for _ in range(1024)]
+        slots = iter(lookups * (args.iterations // len(lookups) + 2))
+        days_doctors = iter(lookups * (args.iterations // len(lookups) + 2))
+
+        def time_slot_grid():
+            day, _, doctor = next(days_doctors)
+            return App.generate_time_slots("07:00", "20:30", 30, day, App.get_occupied_time_slots(day, doctor))
+
+        def bitmap_grid(clear):
+            # Each case walks the lookups from the start; the hit case runs after every lookup was loaded once.
+            keys = iter(lookups * (args.iterations // len(lookups) + 2))
+
+            def grid():
+                day, _, doctor = next(keys)
+                if clear:
+                    App.availability.cache.invalidate(day, doctor)
+                return App.availability.cache.slots(day, doctor)
+            return grid
+
+        for day, _, doctor in lookups:
+            expected = App.generate_time_slots("07:00", "20:30", 30, day, App.get_occupied_time_slots(day, doctor))
+            if App.availability.cache.slots(day, doctor) != expected:
+                raise SystemExit(f"Availability bitmap disagrees with generate_time_slots for {day} {doctor}")
+
+        # Bookings land after the seeded days, so every requested slot is free.
+        booking_day = first_day + timedelta(days=days)
+        bookings = iter(range(rows, rows + args.bookings + 10))
+
+        def full_booking():
+            i = next(bookings) - rows
+            slot, doctor_index = divmod(i, len(doctors))
+            day, time_index = divmod(slot, len(SLOT_TIMES))
+            return book(App, "I would like to book an appointment", 'Bench', f'booking{rows + i}@example.com',
+                        f'9{rows + i:010d}', booking_day + timedelta(days=day), doctors[doctor_index],
+                        SLOT_TIMES[time_index])
+
+        section = f'database, {rows} rows'
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[section] = {
+                'is_time_slot_available': common.measure(lambda: App.is_time_slot_available(*next(slots)),
+                                                         args.iterations),
+                'get_occupied + generate_time_slots': common.measure(time_slot_grid, args.iterations),
+                'availability grid, bitmap hit': common.measure(bitmap_grid(False), args.iterations),
+                'availability grid, bitmap miss': common.measure(bitmap_grid(True), args.iterations),
+                'booking conversation (steps 1-7)': common.measure(full_booking, args.bookings, warmup=10),
+            }
+        common.print_results(f"Database lookups, {rows} rows", results[section])
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'args': vars(args),
+        'results': results,
+    }
+    output = args.output or f'bench_hot_paths-{commit}.json'
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {output}")
+    if args.compare:
+        compare(args.compare, report)
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
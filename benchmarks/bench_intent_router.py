@@ -0,0 +1,59 @@
+import argparse
+import random
+
+import common
+
+import inference
+import intent_router
+from app.tipo.responses import greetings, farewell
+
+TYPED = ["Hello", "HELLO!!", "whats up", "good mornig", "Thanks!", "good bye", "I need an apointment",
+         "can I shedule a visit", "book an appointment", "I have a headache"]
+
+
+def legacy_route(message):
+    # The list and substring checks responde() used before the router.
+    if message.lower() in greetings:
+        return intent_router.GREETING
+    elif message.lower() in farewell:
+        return intent_router.FAREWELL
+    elif "appointment" in message.lower() or "book" in message.lower() or "schedule" in message.lower():
+        return intent_router.BOOKING
+    return intent_router.SYMPTOMS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the intent router with the list checks it replaced.")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    router = intent_router.build_router()
+    for name, phrases, intent in (('greetings', greetings, intent_router.GREETING),
+                                  ('farewells', farewell, intent_router.FAREWELL)):
+        print(f"{name}: {sum(legacy_route(phrase) == intent for phrase in phrases)}/{len(phrases)} entries "
+              f"reachable with the list checks, {sum(router.route(phrase) == intent for phrase in phrases)} "
+              f"with the router")
+    print(f"{len(router.phrases)} normalized phrases, {len(router.near_misses)} typo variants")
+    for message in TYPED:
+        print(f"  {message!r:<28} list checks: {legacy_route(message):<9} router: {router.route(message)}")
+
+    train_data, test_data = inference.load_dataset()
+    symptoms = train_data['text'].tolist() + test_data['text'].tolist()
+    changed = [message for message in symptoms if router.route(message) != legacy_route(message)]
+    print(f"{len(changed)} of {len(symptoms)} dataset messages routed differently")
+
+    # Chat traffic: mostly symptom descriptions, some small talk and booking requests.
+    rng = random.Random(0)
+    traffic = rng.choices(symptoms, k=800) + rng.choices(greetings + farewell, k=150) + rng.choices(TYPED, k=50)
+    rng.shuffle(traffic)
+    results = {}
+    for name, route in (('list checks', legacy_route), ('router', router.route)):
+        messages = iter(traffic * (args.iterations // len(traffic) + 2))
+        results[f'{name}, mixed traffic'] = common.measure(lambda: route(next(messages)), args.iterations)
+        results[f'{name}, greeting'] = common.measure(lambda: route("hey, how are you?"), args.iterations)
+        results[f'{name}, symptom message'] = common.measure(lambda: route(symptoms[0]), args.iterations)
+    common.print_results("Intent routing", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import common
+
+import availability
+import db
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import book_appointment
+
+
+def seed(path, rows, doctors, full_days, occupancy, seed=0):
+    # Every slot of every doctor is booked for the first `full_days` days, then each slot is booked with
+    # probability `occupancy`, day after day, until there are `rows` appointments.
+    rng = random.Random(seed)
+    today = datetime.now().date()
+
+    def generate():
+        count = 0
+        day = 0
+        while count < rows:
+            date_str = (today + timedelta(days=day)).strftime("%Y-%m-%d")
+            for doctor in doctors:
+                for slot in availability.SLOT_TIMES:
+                    if count < rows and (day < full_days or rng.random() < occupancy):
+                        yield (rng.randint(100000, 999999), 'Seed', 'Patient', f'seed{count}@example.com',
+                               f'{count:011d}', date_str, slot, doctor)
+                        count += 1
+            day += 1
+
+    db.close_all()
+    db.DB_PATH = path
+    db.initialize()
+    conn = sqlite3.connect(path)
+    conn.executemany(db.INSERT_APPOINTMENT, generate())
+    conn.commit()
+    conn.close()
+
+
+def per_day_scan(doctors, count, days, now=None):
+    # The same search on the existing helpers: one query per doctor-day and a list scan per slot.
+    now = now or datetime.now()
+    found = []
+    for offset in range(days):
+        date_str = (now.date() + timedelta(days=offset)).strftime("%Y-%m-%d")
+        occupied = {doctor: db.occupied_times(date_str, doctor) for doctor in doctors}
+        for slot in availability.SLOT_TIMES:
+            if datetime.strptime(f"{date_str} {slot}", "%Y-%m-%d %H:%M") <= now:
+                continue
+            for doctor in doctors:
+                if slot not in occupied[doctor]:
+                    found.append((date_str, slot, doctor))
+                    if len(found) == count:
+                        return found
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the next-free-slots search against a per-day scan.")
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--full-days', type=int, default=20, help="Days with every slot booked.")
+    parser.add_argument('--occupancy', type=float, default=0.9, help="Share of slots booked after that.")
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    doctors = sorted(set(book_appointment.disease_to_doctor.values()))
+    workdir = tempfile.TemporaryDirectory()
+    start = time.perf_counter()
+    seed(os.path.join(workdir.name, 'appointments.db'), args.rows, doctors, args.full_days, args.occupancy)
+    print(f"Seeded {args.rows} appointments for {len(doctors)} doctors in {time.perf_counter() - start:.1f}s")
+
+    # The pool is LIFO, so the traced connection is the one full_days() checks out next.
+    sql = []
+    with db.connection() as conn:
+        conn.set_trace_callback(sql.append)
+    db.full_days(doctors, '2030-01-01', '2030-01-07', availability.SLOT_TIMES)
+    with db.connection() as conn:
+        conn.set_trace_callback(None)
+        plan = ' '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql[-1]))
+    print(f"Window query plan: {plan}")
+    if 'COVERING INDEX idx_appointments_slot' not in plan:
+        raise SystemExit("The window query does not use the slot index")
+
+    dermatology = book_appointment.doctors_for_condition('Acne')
+    cases = [
+        ('1 doctor, 3 slots, 14 days (all booked)', doctors[:1], 3, 14),
+        ('1 doctor, 3 slots, 60 days', doctors[:1], 3, 60),
+        (f'{len(dermatology)} doctors for Acne, 3 slots, 60 days', dermatology, 3, 60),
+        (f'{len(doctors)} doctors, 10 slots, 60 days', doctors, 10, 60),
+    ]
+    # Cold runs bypass the availability cache, so every doctor-day with room is read from the database.
+    uncached = lambda date_str, doctor: availability.to_bitmap(db.occupied_times(date_str, doctor))
+    results = {}
+    for name, case_doctors, count, days in cases:
+        now = datetime.now()
+        expected = per_day_scan(case_doctors, count, days, now)
+        got = availability.next_free_slots(case_doctors, count, days, now)
+        if got != expected:
+            raise SystemExit(f"next_free_slots disagrees with the per-day scan for {name}: {got} != {expected}")
+        print(f"{name}: {got[0] if got else 'none'}{' ...' if len(got) > 1 else ''}")
+        availability.cache.clear()
+        results[f'{name}, next_free_slots, cold'] = common.measure(
+            lambda: availability.next_free_slots(case_doctors, count, days, occupied=uncached), args.iterations)
+        results[f'{name}, next_free_slots, warm'] = common.measure(
+            lambda: availability.next_free_slots(case_doctors, count, days), args.iterations)
+        results[f'{name}, per-day scan'] = common.measure(
+            lambda: per_day_scan(case_doctors, count, days), max(10, args.iterations // 10), warmup=2)
+    common.print_results(f"Next free slots ({args.rows} appointments)", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import json
+import subprocess
+import sys
+
+import common  # noqa: F401  (sets up sys.path for the child processes)
+
+SNIPPETS = {
+    # What importing nltk_utils used to do before serving anything.
+    'legacy import (download checks)': """
+import nltk
+from nltk.stem.snowball import SnowballStemmer
+from nltk.corpus import stopwords
+from sklearn.feature_extraction.text import TfidfVectorizer
+nltk.download('stopwords')
+nltk.download('punkt')
+stopwords.words('english')
+""",
+    'import nltk_utils': """
+from app.tipo import nltk_utils
+""",
+    'import + first vectorizer and message': """
+from app.tipo import nltk_utils
+nltk_utils.cria_tfidf_vector()
+nltk_utils.stem_tokenizar_rapido("i have a rash. it itches")
+""",
+}
+
+RUNNER = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+{snippet}
+print(json.dumps({{'seconds': time.perf_counter() - start}}))
+"""
+
+
+def run(snippet, timeout):
+    code = RUNNER.format(paths=sys.path[:2], snippet=snippet)
+    try:
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True,
+                                timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    if output.returncode != 0:
+        lines = [line.strip() for line in output.stderr.splitlines() if line.strip().strip('*')]
+        errors = [i for i, line in enumerate(lines) if 'Error' in line] or [len(lines) - 1]
+        return {'error': ' '.join(lines[errors[-1]:errors[-1] + 2])}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of nltk_utils before and after "
+                                                 "moving NLTK resources to a lazy, offline cache.")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"  {'case':<40} {'best s':>10} {'worst s':>10}")
+    for name, snippet in SNIPPETS.items():
+        samples = [run(snippet, args.timeout) for _ in range(args.runs)]
+        if any(sample is None for sample in samples):
+            print(f"  {name:<40} timed out after {args.timeout:.0f}s")
+            continue
+        if any('error' in sample for sample in samples):
+            print(f"  {name:<40} failed: {next(s['error'] for s in samples if 'error' in s)}")
+            continue
+        seconds = [sample['seconds'] for sample in samples]
+        print(f"  {name:<40} {min(seconds):>10.3f} {max(seconds):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
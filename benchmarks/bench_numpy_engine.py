@@ -0,0 +1,82 @@
+import argparse
+import json
+import subprocess
+import sys
+
+import common
+import numpy as np
+
+import inference
+
+STARTUP_SNIPPET = """
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path[:0] = {paths!r}
+import inference
+context = inference.build_inference_context(engine={engine!r})
+context.predict("I have a headache and a fever")
+elapsed = time.perf_counter() - start
+# ru_maxrss survives fork+exec on Linux, so prefer the fresh high-water mark of this image.
+try:
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'startup_s': elapsed,
+    'max_rss_mb': rss_kb / 1024.0,
+    'torch_imported': 'torch' in sys.modules,
+}}))
+"""
+
+
+def measure_startup(engine, runs):
+    samples = []
+    for _ in range(runs):
+        snippet = STARTUP_SNIPPET.format(paths=sys.path[:2], engine=engine)
+        output = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True, check=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        'startup_s': min(sample['startup_s'] for sample in samples),
+        'max_rss_mb': min(sample['max_rss_mb'] for sample in samples),
+        'torch_imported': samples[0]['torch_imported'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the torch and NumPy CustomRNNModel engines.")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--startup-runs', type=int, default=3)
+    args = parser.parse_args()
+
+    torch_context = inference.build_inference_context(engine='torch')
+    numpy_context = inference.build_inference_context(engine='numpy')
+    _, test_data = inference.load_dataset()
+    messages = test_data['text'].tolist()
+    transform_text = torch_context.vectorizer.transform(messages)
+
+    torch_probs = torch_context.engine.predict_proba(transform_text)
+    numpy_probs = numpy_context.engine.predict_proba(transform_text)
+    print(f"Max |torch - numpy| probability difference: {np.abs(torch_probs - numpy_probs).max():.2e}, "
+          f"argmax agreement {np.mean(torch_probs.argmax(1) == numpy_probs.argmax(1)):.2%}")
+    if not np.allclose(torch_probs, numpy_probs, atol=1e-5):
+        raise SystemExit("NumPy engine does not match the torch engine")
+
+    message = messages[0]
+    batch = transform_text[:64]
+    results = {}
+    for name, context in (('torch', torch_context), ('numpy', numpy_context)):
+        results[f'{name}, predict 1 message'] = common.measure(lambda: context.predict(message), args.iterations)
+        results[f'{name}, engine batch of {batch.shape[0]}'] = common.measure(
+            lambda: context.engine.predict_proba(batch), args.iterations, ops_per_call=batch.shape[0])
+    common.print_results("Per-message latency", results)
+
+    print("Cold startup (import + build + first prediction, best of runs)")
+    for engine in inference.ENGINES:
+        startup = measure_startup(engine, args.startup_runs)
+        print(f"  {engine:<8} {startup['startup_s']:>8.3f}s  max RSS {startup['max_rss_mb']:>8.1f} MB  "
+              f"torch imported: {startup['torch_imported']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import random
+
+import common
+
+import inference
+import prediction_cache
+
+TYPED_PHRASES = ["I have a headache", "i have a  HEADACHE", "headache, I have", "fever and cough",
+                 "Cough and fever", "my skin is itchy", "My skin is itchy.", "I feel dizzy and tired"]
+
+
+def workload(messages, size, seed=0):
+    # Chat traffic repeats a few phrases a lot: draw with a Zipf-like weight over the candidate messages.
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(messages))]
+    return rng.choices(messages, weights=weights, k=size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay repeated chat messages through the prediction cache.")
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    context = inference.get_inference_context()
+    _, test_data = inference.load_dataset()
+    messages = TYPED_PHRASES + test_data['text'].tolist()
+    requests = workload(messages, args.requests)
+
+    cache = prediction_cache.PredictionCache(prediction_cache.key_function(context.featurizer),
+                                             artifact_id=context.artifact_id)
+    wrong = [message for message in requests
+             if cache.predict(message, context.predict, artifact_id=context.artifact_id) != context.predict(message)]
+    if wrong:
+        raise SystemExit(f"{len(wrong)} cached predictions differ from the model, e.g. {wrong[0]!r}")
+    stats = cache.stats()
+    print(f"Replayed {len(requests)} requests: hit rate {stats['hit_rate']:.1%}, {stats['entries']} entries, "
+          f"{stats['bytes'] / 1024:.1f} KB")
+
+    cache.invalidate(context.artifact_id)
+    cached = iter(requests * 2)
+    uncached = iter(requests * 2)
+    results = {
+        'uncached predict': common.measure(lambda: context.predict(next(uncached)), len(requests) // 2),
+        'cached predict': common.measure(
+            lambda: cache.predict(next(cached), context.predict, artifact_id=context.artifact_id),
+            len(requests) // 2),
+        'key only': common.measure(lambda: cache.key_function(TYPED_PHRASES[0])),
+    }
+    common.print_results("Prediction cache", results)
+
+
+if __name__ == "__main__":
+    main()
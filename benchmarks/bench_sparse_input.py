@@ -0,0 +1,60 @@
+import argparse
+
+import common
+import torch
+
+import inference
+
+
+def dense_logits(model, transform_text):
+    with torch.no_grad():
+        return model(torch.tensor(transform_text.toarray()).float())
+
+
+def sparse_logits(model, transform_text):
+    with torch.no_grad():
+        return model.forward_sparse(transform_text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the dense and sparse-input CustomRNNModel paths.")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    context = inference.get_inference_context(engine='torch')
+    model, vectorizer = context.engine.model, context.vectorizer
+    _, test_data = inference.load_dataset()
+    messages = test_data['text'].tolist()
+    transform_all = vectorizer.transform(messages)
+
+    # Dense forward treats a 2-D input as one sequence, so the reference is one dense call per row.
+    reference = torch.cat([dense_logits(model, transform_all[i]) for i in range(transform_all.shape[0])])
+    single_diff = max((dense_logits(model, transform_all[i]) - sparse_logits(model, transform_all[i])).abs().max().item()
+                      for i in range(transform_all.shape[0]))
+    batch_diff = (reference - sparse_logits(model, transform_all)).abs().max().item()
+    print(f"Max |dense - sparse| logit difference: single {single_diff:.2e}, batch {batch_diff:.2e}")
+    if not torch.allclose(reference, sparse_logits(model, transform_all), atol=1e-5):
+        raise SystemExit("Sparse path is not numerically equivalent to the dense path")
+
+    single = transform_all[0]
+    batch = transform_all[:args.batch_size]
+    message = messages[0]
+    results = {
+        'model only, dense, 1 message': common.measure(lambda: dense_logits(model, single), args.iterations),
+        'model only, sparse, 1 message': common.measure(lambda: sparse_logits(model, single), args.iterations),
+        f'model only, dense, {batch.shape[0]} x 1 message': common.measure(
+            lambda: [dense_logits(model, batch[i]) for i in range(batch.shape[0])],
+            args.iterations // 10, ops_per_call=batch.shape[0]),
+        f'model only, sparse, batch of {batch.shape[0]}': common.measure(
+            lambda: sparse_logits(model, batch), args.iterations, ops_per_call=batch.shape[0]),
+        'transform + dense, 1 message': common.measure(
+            lambda: dense_logits(model, vectorizer.transform([message])), args.iterations),
+        'transform + sparse, 1 message': common.measure(
+            lambda: sparse_logits(model, vectorizer.transform([message])), args.iterations),
+    }
+    common.print_results("Sparse vs dense input projection", results)
+
+
+if __name__ == "__main__":
+    main()
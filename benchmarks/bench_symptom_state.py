@@ -0,0 +1,69 @@
+import argparse
+
+import common
+import numpy as np
+
+import inference
+import symptom_state
+
+
+def conversations(texts, turns):
+    # Split each dataset description into sentences and replay them as consecutive chat turns.
+    for text in texts:
+        sentences = [sentence.strip() + '.' for sentence in text.split('.') if sentence.strip()]
+        if len(sentences) >= 2:
+            yield sentences[:turns]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare incremental multi-turn scoring with re-scoring the "
+                                                 "whole conversation.")
+    parser.add_argument('--engine', default='torch', choices=inference.ENGINES)
+    parser.add_argument('--turns', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=300)
+    args = parser.parse_args()
+
+    context = inference.build_inference_context(engine=args.engine)
+    _, test_data = inference.load_dataset()
+    dialogues = list(conversations(test_data['text'], args.turns))
+
+    max_diff = 0.0
+    agree = total = 0
+    for dialogue in dialogues:
+        state = symptom_state.SymptomState(context.featurizer, context.engine, max_turns=args.turns)
+        for turn in range(len(dialogue)):
+            state.add(dialogue[turn])
+            expected = context.predict_proba([' '.join(dialogue[:turn + 1])])[0]
+            actual = state.predict_proba()
+            max_diff = max(max_diff, float(np.abs(expected - actual).max()))
+            agree += int(expected.argmax() == actual.argmax())
+            total += 1
+    print(f"{len(dialogues)} dialogues, {total} turns: max |full - incremental| probability difference "
+          f"{max_diff:.2e}, argmax agreement {agree / total:.2%}")
+    if max_diff > 1e-4:
+        raise SystemExit("Incremental scoring drifted from re-scoring the whole conversation")
+
+    dialogue = max(dialogues, key=len)
+
+    def incremental():
+        state = symptom_state.SymptomState(context.featurizer, context.engine, max_turns=args.turns)
+        for message in dialogue:
+            state.add(message)
+            state.predict()
+
+    def rescore():
+        for turn in range(len(dialogue)):
+            context.predict(' '.join(dialogue[:turn + 1]))
+
+    # ops/s counts chat turns.
+    results = {
+        f'incremental, {len(dialogue)} turns': common.measure(incremental, args.iterations,
+                                                              ops_per_call=len(dialogue)),
+        f'full re-score, {len(dialogue)} turns': common.measure(rescore, args.iterations,
+                                                                ops_per_call=len(dialogue)),
+    }
+    common.print_results("Multi-turn symptom scoring", results)
+
+
+if __name__ == "__main__":
+    main()
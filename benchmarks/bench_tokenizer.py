@@ -0,0 +1,85 @@
+import argparse
+import random
+
+import common
+import numpy as np
+
+import inference
+from app.tipo import nltk_utils
+
+# A curly quote or guillemet after a sentence-final period: Punkt keeps the period on the word, so these must
+# reach the NLTK fallback. The last two are quoted sentences that split the same way either way.
+CURLY_QUOTE_CASES = [
+    "e etc. \u201c", "my skin itches.  \u201c", "fever. \xab it is worse", "pain. \u201c",
+    "it started yesterday. \u2018 now", "itchy skin! \u201cworse at night\u201d", "fever. \u201cI feel cold\u201d",
+]
+FUZZ_PIECES = ['e', 'etc', 'dr', 'mr', 'pain', 'fever', 'i', 'it', "don't", 'a-b', '12', '3.5', 'U.S.', 'e.g.',
+               '.', '. ', '? ', '! ', '...', ',', ' ', '\n', '"', "'", '``', "''", '\u2018', '\u2019', '\u201c',
+               '\u201d', '\u201e', '\xab', '\xbb', '\u2039', '\u203a', '(', ')', '[', ']', '{', '}', '<', '>', '-',
+               '--', '\u2014', '\u2026', ':', ';', '*', '%', '&']
+
+
+def fuzz_texts(count, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(FUZZ_PIECES) + rng.choice(['', ' ', ' ']) for _ in range(rng.randint(1, 10)))
+            for _ in range(count)]
+
+
+def token_mismatches(label, texts):
+    # The vectorizer lowercases before tokenizing, so compare on the text the tokenizer actually sees.
+    mismatched = [text for text in texts
+                  if nltk_utils.stem_tokenizar_rapido(text.lower()) != nltk_utils.stem_tokenizar(text.lower())]
+    print(f"Token mismatches, {label}: {len(mismatched)} of {len(texts)}")
+    for text in mismatched[:5]:
+        print(f"  {text!r}")
+    return mismatched
+
+
+def check_parity(texts, train_texts, fuzz_count):
+    mismatched = (token_mismatches('dataset rows', texts)
+                  + token_mismatches('curly quote cases', CURLY_QUOTE_CASES)
+                  + token_mismatches('fuzzed strings', fuzz_texts(fuzz_count)))
+
+    reference = nltk_utils.cria_tfidf_vector(tokenizer=nltk_utils.stem_tokenizar)
+    fast = nltk_utils.cria_tfidf_vector(tokenizer=nltk_utils.stem_tokenizar_rapido)
+    reference_matrix = reference.fit_transform(train_texts)
+    fast_matrix = fast.fit_transform(train_texts)
+    same_vocabulary = reference.vocabulary_ == fast.vocabulary_
+    same_idf = np.array_equal(reference.idf_, fast.idf_)
+    same_train = (reference_matrix != fast_matrix).nnz == 0
+    same_all = (reference.transform(texts) != fast.transform(texts)).nnz == 0
+    print(f"Vocabulary identical: {same_vocabulary} ({len(fast.vocabulary_)} terms), IDF identical: {same_idf}, "
+          f"TF-IDF identical: train {same_train}, all rows {same_all}")
+    return not mismatched and same_vocabulary and same_idf and same_train and same_all
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time the regex tokenizer against word_tokenize.")
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--fit-iterations', type=int, default=5)
+    parser.add_argument('--fuzz', type=int, default=100000, help="Random punctuation-heavy strings to check.")
+    args = parser.parse_args()
+
+    train_data, test_data = inference.load_dataset(args.data)
+    train_texts = train_data['text'].tolist()
+    texts = train_texts + test_data['text'].tolist()
+    if not check_parity(texts, train_texts, args.fuzz):
+        raise SystemExit("Fast tokenizer does not reproduce stem_tokenizar")
+
+    message = test_data['text'].iloc[0]
+    results = {}
+    for name, tokenizer in (('word_tokenize', nltk_utils.stem_tokenizar),
+                            ('regex + cache', nltk_utils.stem_tokenizar_rapido)):
+        vectorizer = nltk_utils.cria_tfidf_vector(tokenizer=tokenizer)
+        results[f'{name}, fit {len(train_texts)} rows'] = common.measure(
+            lambda: vectorizer.fit(train_texts), args.fit_iterations, warmup=1, ops_per_call=len(train_texts))
+        results[f'{name}, transform 1 message'] = common.measure(
+            lambda: vectorizer.transform([message]), args.iterations)
+        results[f'{name}, tokenize 1 message'] = common.measure(lambda: tokenizer(message.lower()), args.iterations)
+    common.print_results("Tokenizer throughput (ops/s = rows/s for fit)", results)
+    print(f"Stem cache: {nltk_utils.stem_cached.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+
+import common
+
+import inference
+import tracing
+
+
+def empty():
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of the span recorder, disabled, enabled and profiling.")
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    recorder = tracing.recorder
+    context = inference.get_inference_context()
+    message = inference.WARMUP_MESSAGE
+
+    def in_span():
+        with recorder.span('bench'):
+            pass
+
+    results = {'no span': common.measure(empty, args.iterations)}
+    recorder.enabled = False
+    results['span, disabled'] = common.measure(in_span, args.iterations)
+    results['predict, tracing disabled'] = common.measure(lambda: context.predict(message), args.iterations // 10)
+    recorder.enabled = True
+    results['span, enabled'] = common.measure(in_span, args.iterations)
+    results['predict, tracing enabled'] = common.measure(lambda: context.predict(message), args.iterations // 10)
+
+    def profiled_predict():
+        with recorder.request('bench.request'):
+            context.predict(message)
+
+    recorder.sample_every = 1
+    results['predict, profiled'] = common.measure(profiled_predict, 50)
+    recorder.sample_every = 0
+    common.print_results("Span recorder overhead", results)
+
+    print("Recorded stages")
+    for name, stats in recorder.stats().items():
+        print(f"  {name:<24} count {stats['count']:>7}  p50 {stats['p50_ms']:.4f}ms  p99 {stats['p99_ms']:.4f}ms")
+    print(recorder.profiles()[-1]['report'])
+
+
+if __name__ == "__main__":
+    main()
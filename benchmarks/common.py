@@ -0,0 +1,47 @@
+import math
+import os
+import sys
+import time
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.abspath(os.path.join(APP_DIR, '..')))
+sys.path.insert(0, APP_DIR)
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, ops_per_call=1):
+    ordered = sorted(samples)
+    total = sum(samples)
+    return {
+        'iterations': len(samples),
+        'mean_ms': total / len(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'ops_per_sec': ops_per_call * len(samples) / total if total else 0.0,
+    }
+
+
+def measure(fn, iterations=200, warmup=10, ops_per_call=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, ops_per_call)
+
+
+def print_results(title, results):
+    print(title)
+    print(f"  {'case':<40} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>12}")
+    for name, stats in results.items():
+        print(f"  {name:<40} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+              f"{stats['p99_ms']:>10.3f} {stats['ops_per_sec']:>12.1f}")
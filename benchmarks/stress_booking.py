@@ -0,0 +1,150 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import common
+
+import db
+
+LEGACY_SCHEMA = db.SCHEMA
+DOCTOR = "Dr. Stress - General Physician"
+
+
+def legacy_database(path, rows, duplicates):
+    # An appointments.db as the app created it before the migration: no indexes, no user_version, and a few
+    # slots booked twice.
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    values = [(100000 + i, 'Old', 'Patient', f'old{i}@example.com', f'{i:011d}', f'2030-01-{1 + i // 1000 % 28:02d}',
+               f'{7 + i % 14:02d}:{30 * (i // 14 % 2):02d}', f'Dr. Legacy {i // 28 % 40}') for i in range(rows)]
+    conn.executemany(db.INSERT_APPOINTMENT, values)
+    conn.executemany(db.INSERT_APPOINTMENT, [(200000 + i, 'Dup', 'Patient', f'dup{i}@example.com', f'9{i:010d}')
+                                             + value[5:] for i, value in enumerate(values[:duplicates])])
+    conn.commit()
+    conn.close()
+
+
+def check_migration(path, rows, duplicates):
+    legacy_database(path, rows, duplicates)
+    db.close_all()
+    db.DB_PATH = path
+    start = time.perf_counter()
+    db.initialize()
+    seconds = time.perf_counter() - start
+
+    conn = sqlite3.connect(path)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    kept = conn.execute('SELECT COUNT(*) FROM appointments').fetchone()[0]
+    moved = conn.execute('SELECT COUNT(*) FROM appointment_conflicts').fetchone()[0]
+    doubled = conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM appointments GROUP BY doctor, date, time '
+                           'HAVING COUNT(*) > 1)').fetchone()[0]
+    plans = {sql: ' '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+             for sql, params in ((db.SLOT_TAKEN, ('2030-01-01', '07:00', DOCTOR)),
+                                 (db.OCCUPIED_TIMES, ('2030-01-01', DOCTOR)),
+                                 (db.PHONE_EXISTS, ('0',)),
+                                 (db.APPOINTMENT_EXISTS, (1, 'a@example.com')))}
+    conn.close()
+    print(f"Migration of {rows + duplicates} legacy rows took {seconds * 1000:.1f}ms: schema version {version}, "
+          f"{kept} kept, {moved} moved to appointment_conflicts, {doubled} slots still double-booked")
+    for sql, plan in plans.items():
+        print(f"  {plan:<70} {' '.join(sql.split())[:60]}")
+    return (version == db.SCHEMA_VERSION and moved == duplicates and kept == rows and not doubled
+            and all('SCAN' not in plan for plan in plans.values()))
+
+
+def check_then_insert(path):
+    # The booking step before reserve_appointment(): an availability check, then an INSERT on another connection.
+    def reserve(appointment_number, first_name, last_name, email, phone, date, time, doctor):
+        conn = sqlite3.connect(path, timeout=30)
+        taken = conn.execute(db.SLOT_TAKEN, (date, time, doctor)).fetchone() is not None
+        conn.close()
+        if taken:
+            raise db.SlotTaken(time)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute(db.INSERT_APPOINTMENT, (appointment_number, first_name, last_name, email, phone, date, time,
+                                             doctor))
+        conn.commit()
+        conn.close()
+    return reserve
+
+
+def stress(reserve, path, writers, slots):
+    # Every writer goes for the same slot at the same moment, slot after slot.
+    outcomes = Counter()
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(writers)
+
+    def writer(worker):
+        local = Counter()
+        local_samples = []
+        for slot in range(slots):
+            date = f'2031-{1 + slot // 28 % 12:02d}-{1 + slot % 28:02d}'
+            n = slot * writers + worker
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                reserve(n, 'Stress', 'Patient', f'stress{n}@example.com', f'8{n:010d}', date, '09:00', DOCTOR)
+                local['booked'] += 1
+            except db.SlotTaken:
+                local['conflict'] += 1
+            except sqlite3.Error as e:
+                local[f'error: {e}'] += 1
+            local_samples.append(time.perf_counter() - start)
+        with lock:
+            outcomes.update(local)
+            samples.extend(local_samples)
+
+    threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = sqlite3.connect(path)
+    doubled = conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM appointments WHERE doctor = ? '
+                           'GROUP BY date, time HAVING COUNT(*) > 1)', (DOCTOR,)).fetchone()[0]
+    conn.close()
+    return outcomes, doubled, common.summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a legacy appointments database and race many writer "
+                                                 "threads for the same slots.")
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--slots', type=int, default=100)
+    parser.add_argument('--legacy-rows', type=int, default=20000)
+    parser.add_argument('--legacy-duplicates', type=int, default=25)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    ok = check_migration(os.path.join(workdir.name, 'legacy.db'), args.legacy_rows, args.legacy_duplicates)
+
+    results = {}
+    unsafe_path = os.path.join(workdir.name, 'unsafe.db')
+    conn = sqlite3.connect(unsafe_path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.close()
+    db.close_all()
+    db.DB_PATH = os.path.join(workdir.name, 'stress.db')
+    db.initialize()
+    for label, reserve, path in (('check then insert (before)', check_then_insert(unsafe_path), unsafe_path),
+                                 ('db.reserve_appointment', db.reserve_appointment, db.DB_PATH)):
+        outcomes, doubled, stats = stress(reserve, path, args.writers, args.slots)
+        results[label] = stats
+        print(f"{label}: {args.writers} writers x {args.slots} slots -> {dict(outcomes)}, "
+              f"{doubled} slots double-booked")
+        if path == db.DB_PATH:
+            ok = ok and not doubled and outcomes['booked'] == args.slots and set(outcomes) <= {'booked', 'conflict'}
+    common.print_results("Reservation latency under contention", results)
+    if not ok:
+        raise SystemExit("Migration or atomic reservation check failed")
+    print("Migration and atomic reservation checks passed")
+
+
+if __name__ == "__main__":
+    main()
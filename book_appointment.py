@@ -1,14 +1,17 @@
 import os
 import re
 import smtplib
-import sqlite3
-from datetime import datetime, time as dtime, date as dt_date
+from datetime import datetime, date as dt_date
 from email.mime.text import MIMEText
 from random import randint
 import streamlit as st
 from dotenv import load_dotenv
 import dns.resolver
 
+import availability
+import db
+import label_table
+
 
 load_dotenv()
 
@@ -108,63 +111,34 @@ def send_verification_email(first_name, last_name, email, phone, appointment_dat
         print(f"Debug: General exception occurred: {e}")
         return False
 
+def doctors_for_condition(condition):
+    # The condition's own doctor first, then the other doctors of the same specialty.
+    key = label_table.resolve(condition, disease_to_doctor, 'disease_to_doctor') if condition else None
+    if key is None:
+        return []
+    doctor = disease_to_doctor[key]
+    specialty = doctor.rsplit(' - ', 1)[-1]
+    return [doctor] + sorted({other for other in disease_to_doctor.values()
+                              if other != doctor and other.rsplit(' - ', 1)[-1] == specialty})
+
+
 def validate_input(user_input):
     pattern = re.compile(r'[^a-zA-Z\s]')
     if pattern.search(user_input):
         return False
     return True
 
-def initialize_db():
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            appointment_number INTEGER NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT NOT NULL UNIQUE,
-            phone TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            doctor TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
 def check_email_exists(email):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE email = ?", (email,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    return db.email_exists(email)
 
 def check_phone_exists(phone):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE phone = ?", (phone,))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    return db.phone_exists(phone)
 
 def check_appointment_exists(appointment_number, email):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE appointment_number = ? AND email = ?", (appointment_number, email))
-    exists = cursor.fetchone() is not None
-    conn.close()
-    return exists
+    return db.appointment_exists(appointment_number, email)
 
 def is_time_slot_available(appointment_date, appointment_time, doctor):
-    conn = sqlite3.connect('data/appointments.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM appointments WHERE date = ? AND time = ? AND doctor = ?",
-                   (appointment_date, appointment_time, doctor))
-    available = cursor.fetchone() is None
-    conn.close()
-    return available
+    return db.slot_available(appointment_date, appointment_time, doctor)
 
 
 def is_appointment_in_future(appointment_date, appointment_time):
@@ -175,22 +149,23 @@ def is_appointment_in_future(appointment_date, appointment_time):
 def book_appointment():
     st.title("Book an Appointment")
 
-    initialize_db()
+    predicted_disease = st.session_state.get('predicted_disease', None)
+    suggested_doctor = disease_to_doctor.get(predicted_disease, "Select a Doctor")
 
-    valid_times = [dtime(hour, minute).strftime("%H:%M") for hour in range(7, 21) for minute in (0, 30)]
+    # Date and doctor sit outside the form so that changing them reruns the page and the time list below
+    # only offers that doctor's free slots.
+    date = st.date_input("Appointment Date", min_value=dt_date.today())
+    doctor = st.selectbox("Choose a Doctor", ["Select a Doctor"] + list(set(disease_to_doctor.values())), index=0)
+    free_times = []
+    if doctor != "Select a Doctor":
+        free_times = availability.cache.free_times(date.strftime("%Y-%m-%d"), doctor)
 
     with st.form("appointment_form"):
         first_name = st.text_input("First Name")
         last_name = st.text_input("Last Name")
         email = st.text_input("Email")
         phone = st.text_input("Phone")
-        date = st.date_input("Appointment Date", min_value=dt_date.today())
-        time = st.selectbox("Appointment Time", valid_times)
-
-        predicted_disease = st.session_state.get('predicted_disease', None)
-        suggested_doctor = disease_to_doctor.get(predicted_disease, "Select a Doctor")
-
-        doctor = st.selectbox("Choose a Doctor", ["Select a Doctor"] + list(set(disease_to_doctor.values())), index=0)
+        time = st.selectbox("Appointment Time", free_times)
 
         submitted = st.form_submit_button("Book Appointment")
 
@@ -210,6 +185,8 @@ def book_appointment():
                 st.error("Invalid phone number. Please enter a correct phone number.")
             elif doctor == "Select a Doctor":
                 st.error("Appointment booking unsuccessful. Please choose a doctor.")
+            elif time is None:
+                st.error("Appointment booking unsuccessful. The doctor has no free time left on this date.")
             elif check_email_exists(email):
                 st.error("Appointment booking unsuccessful. An appointment with this email already exists.")
             elif check_phone_exists(phone):
@@ -222,20 +199,20 @@ def book_appointment():
             else:
                 try:
                     appointment_number = randint(100000, 999999)
+                    # The slot is reserved before the email goes out, and released again if it cannot be sent.
+                    db.reserve_appointment(appointment_number, first_name.strip(), last_name.strip(), email.strip(),
+                                           phone.strip(), date.strftime("%Y-%m-%d"), time, doctor)
+                    availability.cache.invalidate(date.strftime("%Y-%m-%d"), doctor)
                     if not send_verification_email(first_name, last_name, email, phone, date, time, doctor,
                                                    appointment_number):
+                        db.cancel_appointment(email.strip(), appointment_number)
+                        availability.cache.invalidate(date.strftime("%Y-%m-%d"), doctor)
                         st.error("Failed to send verification email. Please try again.")
                     else:
-                        conn = sqlite3.connect('data/appointments.db')
-                        cursor = conn.cursor()
-                        cursor.execute('''
-                            INSERT INTO appointments (appointment_number, first_name, last_name, email, phone, date, time, doctor) 
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (appointment_number, first_name.strip(), last_name.strip(), email.strip(), phone.strip(),
-                              date.strftime("%Y-%m-%d"), time, doctor))
-                        conn.commit()
-                        conn.close()
                         st.success(f"Appointment booked successfully!")
+                except db.SlotTaken:
+                    availability.cache.invalidate(date.strftime("%Y-%m-%d"), doctor)
+                    st.error("Appointment booking unsuccessful. This time slot is already booked.")
                 except Exception as e:
                     st.error(f"An error occurred while booking the appointment: {e}")
 
@@ -262,12 +239,8 @@ def display_cancel_form():
                     "No appointment found with the provided appointment number and email. Please check your details.")
             else:
                 try:
-                    conn = sqlite3.connect('data/appointments.db')
-                    cursor = conn.cursor()
-                    cursor.execute('''DELETE FROM appointments WHERE email=? AND appointment_number=?''',
-                                   (email_input, appointment_number_input))
-                    conn.commit()
-                    conn.close()
+                    for date, doctor in db.cancel_appointment(email_input, appointment_number_input):
+                        availability.cache.invalidate(date, doctor)
                     st.success("Appointment canceled successfully.")
                 except Exception as e:
                     st.error(f"An error occurred while canceling the appointment: {e}")
@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+import numpy_engine
+import tracing
+
+CLASSIFIER_PREFIX = 'classifiers/'
+BACKENDS = ('linear', 'centroid')
+ENSEMBLE_BUDGET_MS = 2.0
+LINEAR_C = 100.0
+CENTROID_SCALES = (5.0, 10.0, 20.0, 30.0, 40.0, 60.0, 80.0, 120.0)
+CENTROID_FOLDS = 5
+
+
+def training_split(vectorizer, names, data_path):
+    # The secondary backends see the same training rows as the RNN, so the hold-out split stays unseen.
+    import inference
+
+    train_data, _ = inference.load_dataset(data_path)
+    class_ids = {name: class_id for class_id, name in names.items()}
+    labels = train_data['label'].map(class_ids)
+    if labels.isna().any():
+        raise ValueError(f"Labels missing from the label map: {sorted(set(train_data['label'][labels.isna()]))}")
+    return vectorizer.transform(train_data['text']).tocsr(), labels.to_numpy(dtype=np.int64)
+
+
+def class_centroids(matrix, labels, n_classes):
+    centroids = np.zeros((n_classes, matrix.shape[1]))
+    for class_id in range(n_classes):
+        rows = matrix[labels == class_id]
+        if rows.shape[0]:
+            centroids[class_id] = np.asarray(rows.mean(axis=0)).ravel()
+    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+    return centroids / np.where(norms > 0.0, norms, 1.0)
+
+
+def fit_centroid_scale(matrix, labels, n_classes, scales=CENTROID_SCALES, folds=CENTROID_FOLDS):
+    # Cosines to the centroids are squashed into a narrow range; the softmax scale that minimises the
+    # cross-validated log loss makes the centroid probabilities comparable with CONFIDENCE_THRESHOLD.
+    fold = np.arange(matrix.shape[0]) % folds
+    losses = np.zeros(len(scales))
+    for k in range(folds):
+        centroids = class_centroids(matrix[fold != k], labels[fold != k], n_classes)
+        cosines = np.asarray(matrix[fold == k] @ centroids.T)
+        for i, scale in enumerate(scales):
+            pred_probs = numpy_engine.softmax(scale * cosines)
+            losses[i] -= np.log(pred_probs[np.arange(len(cosines)), labels[fold == k]] + 1e-12).sum()
+    return float(scales[int(losses.argmin())])
+
+
+def build_arrays(vectorizer, names, data_path):
+    # Run once when the bundle is exported; both backends reduce to a weight matrix over the TF-IDF columns.
+    from sklearn.linear_model import LogisticRegression
+
+    matrix, labels = training_split(vectorizer, names, data_path)
+    n_classes = len(names)
+    linear = LogisticRegression(C=LINEAR_C, max_iter=5000).fit(matrix, labels)
+    if list(linear.classes_) != list(range(n_classes)):
+        raise ValueError(f"Training split covers classes {list(linear.classes_)}, expected 0..{n_classes - 1}")
+    return {
+        CLASSIFIER_PREFIX + 'linear/weights': linear.coef_.T.astype(np.float64),
+        CLASSIFIER_PREFIX + 'linear/bias': linear.intercept_.astype(np.float64),
+        CLASSIFIER_PREFIX + 'centroid/weights': class_centroids(matrix, labels, n_classes).T,
+        CLASSIFIER_PREFIX + 'centroid/scale': np.array(fit_centroid_scale(matrix, labels, n_classes)),
+    }
+
+
+class LinearBackend:
+    # Multinomial logistic regression: one sparse x dense product and a softmax.
+    name = 'linear'
+
+    def __init__(self, weights, bias, scale=1.0):
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.scale = float(scale)
+
+    def predict_proba(self, transform_text):
+        with tracing.span(f'engine.{self.name}'):
+            logits = np.asarray(transform_text @ self.weights)
+            return numpy_engine.softmax(self.scale * logits + self.bias)
+
+
+class CentroidBackend(LinearBackend):
+    # Nearest class centroid: cosine of the l2-normalised TF-IDF row with each class's mean row.
+    name = 'centroid'
+
+    def __init__(self, centroids, scale):
+        super().__init__(centroids, np.zeros(centroids.shape[1]), scale)
+
+
+def build_backends(arrays, names):
+    backends = []
+    for name in names:
+        if name == 'linear':
+            backends.append(LinearBackend(arrays[CLASSIFIER_PREFIX + 'linear/weights'],
+                                          arrays[CLASSIFIER_PREFIX + 'linear/bias']))
+        elif name == 'centroid':
+            backends.append(CentroidBackend(arrays[CLASSIFIER_PREFIX + 'centroid/weights'],
+                                            arrays[CLASSIFIER_PREFIX + 'centroid/scale'].item()))
+        else:
+            raise ValueError(f"Unknown classifier backend {name!r}, expected one of {BACKENDS}")
+    return backends
+
+
+class EnsembleEngine:
+    # The primary engine answers alone when it is confident. Rows under the threshold are re-scored by the
+    # secondary backends in order, and get the mean of the probabilities gathered, so a confident answer needs
+    # the backends consulted to agree. With budget_ms set, a backend is skipped (with the ones after it) when
+    # its expected cost would take the re-scoring past the budget; budget_ms=None always asks every backend.
+    name = 'ensemble'
+
+    def __init__(self, primary, secondaries, threshold, budget_ms=ENSEMBLE_BUDGET_MS):
+        self.primary = primary
+        self.secondaries = list(secondaries)
+        self.threshold = float(threshold)
+        self.budget = None if budget_ms is None else max(0.0, float(budget_ms)) / 1000.0
+        self._stats_lock = threading.Lock()
+        self._row_seconds = {}
+        self._consulted_rows = Counter()
+        self._rows = 0
+        self._fallback_rows = 0
+        self._cut_short_rows = 0
+
+    def __getattr__(self, name):
+        # column_weights() and predict_projected() come from the primary, when it has them.
+        if name == 'primary':
+            raise AttributeError(name)
+        return getattr(self.primary, name)
+
+    def predict_proba(self, transform_text):
+        return self.combine(transform_text, self.primary.predict_proba(transform_text))
+
+    def combine(self, transform_text, pred_probs):
+        return self._combine(transform_text, pred_probs)[0]
+
+    def predict_with_backends(self, transform_text):
+        # predict_proba() plus, per row, the backends that decided it: the primary alone, or the primary
+        # averaged with the secondaries consulted.
+        pred_probs, unsure, consulted = self._combine(transform_text, self.primary.predict_proba(transform_text))
+        backends = [self.primary.name] * len(pred_probs)
+        for row in unsure:
+            backends[row] = '+'.join([self.primary.name] + consulted)
+        return pred_probs, backends
+
+    def _combine(self, transform_text, pred_probs):
+        unsure = np.flatnonzero(pred_probs.max(axis=1) < self.threshold)
+        consulted = []
+        cut_short = False
+        if len(unsure) and self.secondaries:
+            start = time.perf_counter()
+            rows = transform_text[unsure]
+            total = pred_probs[unsure].astype(np.float64)
+            for backend in self.secondaries:
+                if self.budget is not None and not self._fits_budget(backend.name, len(unsure), start):
+                    cut_short = True
+                    break
+                backend_start = time.perf_counter()
+                total += backend.predict_proba(rows)
+                self._record_cost(backend.name, (time.perf_counter() - backend_start) / len(unsure))
+                consulted.append(backend.name)
+            pred_probs = pred_probs.astype(np.float64)
+            pred_probs[unsure] = total / (len(consulted) + 1)
+        with self._stats_lock:
+            self._rows += len(pred_probs)
+            self._fallback_rows += len(unsure)
+            for name in consulted:
+                self._consulted_rows[name] += len(unsure)
+            if cut_short:
+                self._cut_short_rows += len(unsure)
+        return pred_probs, unsure, consulted
+
+    def _fits_budget(self, name, rows, start):
+        # Checked before the backend runs, from its recent cost per row. A skipped backend's estimate is
+        # halved, so one slow call (a cold cache, a busy machine) does not shut it out for good.
+        with self._stats_lock:
+            row_seconds = self._row_seconds.get(name, 0.0)
+            if time.perf_counter() - start + row_seconds * rows <= self.budget:
+                return True
+            self._row_seconds[name] = row_seconds / 2
+            return False
+
+    def _record_cost(self, name, row_seconds):
+        with self._stats_lock:
+            previous = self._row_seconds.get(name)
+            self._row_seconds[name] = row_seconds if previous is None else 0.8 * previous + 0.2 * row_seconds
+
+    def cut_short_rows(self):
+        # Grows whenever the budget leaves an answer short of some backends; the prediction cache does not
+        # keep answers computed while it changed.
+        with self._stats_lock:
+            return self._cut_short_rows
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'rows': self._rows,
+                'fallback_rows': self._fallback_rows,
+                'consulted_rows': dict(self._consulted_rows),
+                'cut_short_rows': self._cut_short_rows,
+                'budget_ms': None if self.budget is None else self.budget * 1000.0,
+            }
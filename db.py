@@ -0,0 +1,227 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_PATH = os.getenv('APPOINTMENTS_DB', 'data/appointments.db')
+BUSY_TIMEOUT_MS = int(os.getenv('APPOINTMENTS_DB_BUSY_TIMEOUT_MS', '5000'))
+POOL_SIZE = int(os.getenv('APPOINTMENTS_DB_POOL_SIZE', '8'))
+SCHEMA_VERSION = 1
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS appointments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        appointment_number INTEGER NOT NULL,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        phone TEXT NOT NULL,
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        doctor TEXT NOT NULL
+    )
+'''
+
+# MIGRATIONS[v] moves a database from user_version v - 1 to v. SQLite cannot add a table constraint to an
+# existing table, so the slot's UNIQUE constraint is a unique index, which new and old databases both get.
+MIGRATIONS = {
+    1: (
+        # Double bookings made before the constraint existed: all but the first booking of a slot are moved
+        # aside, so the unique index can be built and nothing is lost.
+        '''
+        CREATE TABLE IF NOT EXISTS appointment_conflicts (
+            id INTEGER PRIMARY KEY,
+            appointment_number INTEGER NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            doctor TEXT NOT NULL,
+            moved_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        INSERT INTO appointment_conflicts (id, appointment_number, first_name, last_name, email, phone, date, time,
+                                           doctor)
+        SELECT id, appointment_number, first_name, last_name, email, phone, date, time, doctor
+        FROM appointments
+        WHERE id NOT IN (SELECT MIN(id) FROM appointments GROUP BY doctor, date, time)
+        ''',
+        "DELETE FROM appointments WHERE id IN (SELECT id FROM appointment_conflicts)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_slot ON appointments (doctor, date, time)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_phone ON appointments (phone)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_number ON appointments (appointment_number)",
+    ),
+}
+
+# Fixed SQL strings, so each pooled connection prepares a statement once and reuses it from its cache.
+EMAIL_EXISTS = "SELECT 1 FROM appointments WHERE email = ?"
+PHONE_EXISTS = "SELECT 1 FROM appointments WHERE phone = ?"
+APPOINTMENT_EXISTS = "SELECT 1 FROM appointments WHERE appointment_number = ? AND email = ?"
+SLOT_TAKEN = "SELECT 1 FROM appointments WHERE date = ? AND time = ? AND doctor = ?"
+OCCUPIED_TIMES = "SELECT time FROM appointments WHERE date = ? AND doctor = ?"
+INSERT_APPOINTMENT = '''
+    INSERT INTO appointments (appointment_number, first_name, last_name, email, phone, date, time, doctor)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+APPOINTMENT_SLOTS = "SELECT date, doctor FROM appointments WHERE email = ? AND appointment_number = ?"
+DELETE_APPOINTMENT = "DELETE FROM appointments WHERE email = ? AND appointment_number = ?"
+
+_lock = threading.Lock()
+_pools = {}
+
+
+class SlotTaken(Exception):
+    pass
+
+
+def _open(path):
+    # check_same_thread is off because a connection moves between threads through the pool; it is only
+    # ever used by the thread that checked it out.
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+def _pool(path):
+    pool = _pools.get(path)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(path)
+            if pool is None:
+                # The schema is created once per process, by whichever thread reaches the database first.
+                conn = _open(path)
+                migrate(conn)
+                pool = queue.LifoQueue(maxsize=max(1, POOL_SIZE))
+                pool.put(conn)
+                _pools[path] = pool
+    return pool
+
+
+@contextmanager
+def connection(path=None):
+    # Streamlit runs every rerun on a new thread, so connections are kept in a per-process pool rather than
+    # in thread-locals; LIFO hands out the most recently used one, whose pages and statements are warm.
+    pool = _pool(path or DB_PATH)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open(path or DB_PATH)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def migrate(conn):
+    # BEGIN IMMEDIATE takes the write lock before the version is read, so two processes starting together
+    # cannot both apply the same migration.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(SCHEMA)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Appointments database is at schema version {version}, newer than this code "
+                               f"({SCHEMA_VERSION})")
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS[target]:
+                conn.execute(statement)
+        if version < SCHEMA_VERSION:
+            moved = conn.execute("SELECT COUNT(*) FROM appointment_conflicts").fetchone()[0]
+            print(f"Debug: Migrated the appointments database from schema version {version} to {SCHEMA_VERSION}, "
+                  f"{moved} double-booked appointments are in appointment_conflicts")
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def initialize(path=None):
+    _pool(path or DB_PATH)
+
+
+def close_all():
+    with _lock:
+        for pool in _pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+        _pools.clear()
+
+
+def _exists(sql, params):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchone() is not None
+
+
+def email_exists(email):
+    return _exists(EMAIL_EXISTS, (email,))
+
+
+def phone_exists(phone):
+    return _exists(PHONE_EXISTS, (phone,))
+
+
+def appointment_exists(appointment_number, email):
+    return _exists(APPOINTMENT_EXISTS, (appointment_number, email))
+
+
+def slot_available(date, time, doctor):
+    return not _exists(SLOT_TAKEN, (date, time, doctor))
+
+
+def occupied_times(date, doctor):
+    with connection() as conn:
+        return [row[0] for row in conn.execute(OCCUPIED_TIMES, (date, doctor))]
+
+
+def full_days(doctors, first_date, last_date, slot_times):
+    # The (doctor, date) pairs in a window with every one of slot_times booked. SQLite counts on the slot index
+    # alone, so fully booked days are ruled out in one query without returning their bookings.
+    sql = f'''
+        SELECT doctor, date FROM appointments
+        WHERE doctor IN ({', '.join('?' * len(doctors))}) AND date BETWEEN ? AND ?
+              AND time IN ({', '.join('?' * len(slot_times))})
+        GROUP BY doctor, date HAVING COUNT(*) = ?
+    '''
+    with connection() as conn:
+        return set(conn.execute(sql, (*doctors, first_date, last_date, *slot_times, len(slot_times))))
+
+
+def reserve_appointment(appointment_number, first_name, last_name, email, phone, date, time, doctor):
+    # One INSERT in its own transaction; the unique slot index decides between concurrent bookings, so the
+    # loser gets SlotTaken instead of a second row for the same doctor, date and time.
+    try:
+        with connection() as conn:
+            with conn:
+                conn.execute(INSERT_APPOINTMENT, (appointment_number, first_name, last_name, email, phone, date,
+                                                  time, doctor))
+    except sqlite3.IntegrityError as e:
+        if 'appointments.doctor' in str(e):
+            raise SlotTaken(f"{doctor} is already booked on {date} at {time}") from e
+        raise
+
+
+def cancel_appointment(email, appointment_number):
+    # Returns the (date, doctor) of each cancelled appointment, so callers can invalidate cached availability.
+    with connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        slots = conn.execute(APPOINTMENT_SLOTS, (email, appointment_number)).fetchall()
+        conn.execute(DELETE_APPOINTMENT, (email, appointment_number))
+        conn.commit()
+        return slots
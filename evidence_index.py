@@ -0,0 +1,65 @@
+import numpy as np
+import scipy.sparse as sp
+
+EVIDENCE_PREFIX = 'evidence/'
+
+
+def load_examples(data_path):
+    import pandas as pd
+
+    df = pd.read_csv(data_path)
+    df = df.drop(columns=['Unnamed: 0'], errors='ignore').drop_duplicates(subset='text')
+    return df['text'].tolist(), df['label'].tolist()
+
+
+def build_arrays(vectorizer, data_path):
+    # Run once when the bundle is exported. The rows are stored term-major (CSC), so a query only reads
+    # the postings of the terms it contains instead of every example, and in float32, which halves the
+    # memory a query streams through; ranking neighbours does not need more precision.
+    texts, labels = load_examples(data_path)
+    matrix = vectorizer.transform(texts).tocsc()
+    matrix.sort_indices()
+    return {
+        EVIDENCE_PREFIX + 'texts': np.array(texts, dtype=str),
+        EVIDENCE_PREFIX + 'labels': np.array(labels, dtype=str),
+        EVIDENCE_PREFIX + 'data': matrix.data.astype(np.float32),
+        EVIDENCE_PREFIX + 'indices': matrix.indices.astype(np.int32),
+        EVIDENCE_PREFIX + 'indptr': matrix.indptr.astype(np.int64),
+    }
+
+
+class EvidenceIndex:
+    def __init__(self, texts, labels, matrix):
+        self.texts = list(texts)
+        self.labels = list(labels)
+        self.matrix = sp.csc_matrix(matrix, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def from_arrays(cls, arrays, n_features):
+        texts = arrays[EVIDENCE_PREFIX + 'texts'].tolist()
+        matrix = sp.csc_matrix((arrays[EVIDENCE_PREFIX + 'data'], arrays[EVIDENCE_PREFIX + 'indices'],
+                                arrays[EVIDENCE_PREFIX + 'indptr']), shape=(len(texts), n_features))
+        return cls(texts, arrays[EVIDENCE_PREFIX + 'labels'].tolist(), matrix)
+
+    @classmethod
+    def build(cls, vectorizer, data_path):
+        arrays = build_arrays(vectorizer, data_path)
+        return cls.from_arrays(arrays, len(vectorizer.vocabulary_))
+
+    def scores(self, query):
+        # Cosine of the l2-normalised query row with every example: only the query terms' columns are
+        # sliced out, then one sparse mat-vec with the query weights.
+        return self.matrix[:, query.indices] @ query.data.astype(np.float32)
+
+    def nearest(self, query, k=3):
+        scores = self.scores(query)
+        n = len(scores)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, n - k)[n - k:] if k < n else np.arange(n)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(self.texts[i], self.labels[i], float(scores[i])) for i in top if scores[i] > 0.0]
@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class CompiledFeaturizer:
+    # Reproduces TfidfVectorizer.transform for the word-unigram, l2 configuration cria_tfidf_vector()
+    # builds: same counts, same IDF products and the same sequential l2 sum, so rows match bit for bit.
+    def __init__(self, vocabulary, idf, stop_words, tokenizer, lowercase=True, norm='l2', sublinear_tf=False):
+        if norm not in ('l2', None):
+            raise ValueError(f"Unsupported norm {norm!r}, expected 'l2' or None")
+        stop_words = frozenset(stop_words or ())
+        # sklearn drops stop words before the vocabulary lookup, so they never map to a column here.
+        self.columns = {term: column for term, column in vocabulary.items() if term not in stop_words}
+        self.idf = None if idf is None else np.asarray(idf, dtype=np.float64).tolist()
+        self.n_features = len(vocabulary)
+        self.tokenizer = tokenizer
+        self.lowercase = lowercase
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer):
+        if (vectorizer.analyzer != 'word' or tuple(vectorizer.ngram_range) != (1, 1)
+                or vectorizer.preprocessor is not None or vectorizer.strip_accents is not None
+                or vectorizer.tokenizer is None or vectorizer.dtype != np.float64
+                or vectorizer.input != 'content' or vectorizer.binary):
+            raise ValueError("Only word-unigram vectorizers with a custom tokenizer can be compiled")
+        idf = vectorizer.idf_ if vectorizer.use_idf else None
+        return cls(vectorizer.vocabulary_, idf, vectorizer.get_stop_words(), vectorizer.tokenizer,
+                   vectorizer.lowercase, vectorizer.norm, vectorizer.sublinear_tf)
+
+    def column_counts(self, message):
+        columns = self.columns
+        counts = {}
+        for token in self.tokenizer(message.lower() if self.lowercase else message):
+            column = columns.get(token)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        return counts
+
+    def cache_key(self, message):
+        # Two messages with the same in-vocabulary term counts get the same row, whatever their wording.
+        return tuple(sorted(self.column_counts(message).items()))
+
+    def term_weight(self, column, count):
+        weight = math.log(count) + 1.0 if self.sublinear_tf else float(count)
+        return weight * self.idf[column] if self.idf is not None else weight
+
+    def transform(self, messages):
+        if isinstance(messages, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        return self.transform_counts([self.column_counts(message) for message in messages])
+
+    def transform_counts(self, rows):
+        idf = self.idf
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in rows:
+            row = sorted(counts)
+            values = [float(counts[column]) for column in row]
+            if self.sublinear_tf:
+                values = (np.log(np.array(values)) + 1.0).tolist()
+            if idf is not None:
+                values = [value * idf[column] for value, column in zip(values, row)]
+            if self.norm == 'l2':
+                total = 0.0
+                for value in values:
+                    total += value * value
+                if total != 0.0:
+                    total = math.sqrt(total)
+                    values = [value / total for value in values]
+
+            indices += row
+            data += values
+            indptr.append(len(indices))
+
+        return sp.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32),
+                              np.array(indptr, dtype=np.int32)), shape=(len(indptr) - 1, self.n_features))
+
+
+def compile_featurizer(vectorizer):
+    try:
+        return CompiledFeaturizer.from_vectorizer(vectorizer)
+    except ValueError as e:
+        print(f"Debug: Using the sklearn vectorizer for inference ({e})")
+        return vectorizer
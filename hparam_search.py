@@ -0,0 +1,195 @@
+import argparse
+import csv
+import io
+import itertools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import torch
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import inference
+import torch_engine
+import train
+from app.tipo import nltk_utils
+from modelo.model import CustomRNNModel
+
+RESULT_FIELDS = ['trial', 'hidden_dim', 'num_layers', 'activation', 'lr', 'sublinear_tf', 'min_df', 'input_dim',
+                 'best_epoch', 'accuracy', 'parameters', 'size_kb', 'latency_p50_ms', 'latency_p95_ms',
+                 'train_seconds']
+
+_features = None
+_options = None
+
+
+def pretokenized(tokens):
+    return tokens
+
+
+def tokenize_corpus(texts):
+    # The analyzer cria_tfidf_vector() builds: lowercase, stem_tokenizar_rapido, then drop stop words.
+    stop_words = frozenset(nltk_utils.stop_words)
+    return [[token for token in nltk_utils.stem_tokenizar_rapido(text.lower()) if token not in stop_words]
+            for text in texts]
+
+
+def featurize(train_tokens, test_tokens, tfidf_settings):
+    # Trials only differ in how the shared token lists are weighted, so nothing is re-tokenized here.
+    features = {}
+    for settings in tfidf_settings:
+        vectorizer = TfidfVectorizer(analyzer=pretokenized, sublinear_tf=settings[0], min_df=settings[1])
+        train_X = vectorizer.fit_transform(train_tokens).tocsr()
+        features[settings] = (train_X, vectorizer.transform(test_tokens).tocsr())
+    return features
+
+
+def init_worker(features, options):
+    global _features, _options
+    # Trials run side by side, so each one gets a fixed share of the cores instead of torch's default.
+    torch.set_num_threads(options['threads'])
+    _features = features
+    _options = options
+
+
+def serialized_size(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def latency(model, matrix, rows, repeats=3):
+    rows = [matrix[i] for i in range(min(rows, matrix.shape[0]))]
+    samples = []
+    with torch.no_grad():
+        for _ in range(repeats):
+            for row in rows:
+                start = time.perf_counter()
+                model.forward_sparse(row)
+                samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def run_trial(trial, config):
+    options = _options
+    train.set_seed(options['seed'])
+    train_X, test_X = _features[(config['sublinear_tf'], config['min_df'])]
+    fit_X, fit_y, val_X, val_y = train.split_validation(train_X, options['train_y'], options['val_fraction'],
+                                                        options['seed'])
+    model = CustomRNNModel(input_dim=train_X.shape[1], hidden_dim=config['hidden_dim'],
+                           output_dim=options['output_dim'], num_layers=config['num_layers'],
+                           activation=config['activation'])
+    start = time.perf_counter()
+    best_epoch, _ = train.train(model, fit_X, fit_y, val_X, val_y, options['epochs'], options['batch_size'],
+                                config['lr'], options['patience'], num_workers=0, seed=options['seed'],
+                                verbose=False)
+    train_seconds = time.perf_counter() - start
+    _, accuracy = train.evaluate(model, test_X, options['test_y'], torch.nn.CrossEntropyLoss())
+    result = dict(config, trial=trial, input_dim=train_X.shape[1], best_epoch=best_epoch,
+                  accuracy=round(accuracy, 4), parameters=sum(value.numel() for value in model.parameters()),
+                  size_kb=round(serialized_size(model) / 1024, 1), train_seconds=round(train_seconds, 2))
+    return result, {key: value.numpy() for key, value in model.state_dict().items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search CustomRNNModel and TF-IDF settings in parallel and "
+                                                 "report accuracy, size and latency for each trial.")
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--names', default=inference.NAMES_PATH)
+    parser.add_argument('--hidden-dims', type=int, nargs='+', default=[64, 128, 240])
+    parser.add_argument('--num-layers', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--activations', nargs='+', default=['relu', 'tanh'], choices=['relu', 'tanh'])
+    parser.add_argument('--lrs', type=float, nargs='+', default=[1e-3, 3e-3])
+    parser.add_argument('--sublinear-tf', type=int, nargs='+', default=[0, 1], choices=[0, 1])
+    parser.add_argument('--min-df', type=int, nargs='+', default=[1])
+    parser.add_argument('--trials', type=int, default=0, help="Sample this many configurations (0 runs them all).")
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--val-fraction', type=float, default=0.1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads-per-trial', type=int, default=0,
+                        help="torch threads per trial (default: cores divided by workers).")
+    parser.add_argument('--latency-rows', type=int, default=200)
+    parser.add_argument('--min-accuracy', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='hparam_results.csv')
+    args = parser.parse_args()
+
+    grid = [{'hidden_dim': hidden_dim, 'num_layers': num_layers, 'activation': activation, 'lr': lr,
+             'sublinear_tf': bool(sublinear_tf), 'min_df': min_df}
+            for hidden_dim, num_layers, activation, lr, sublinear_tf, min_df in itertools.product(
+                args.hidden_dims, args.num_layers, args.activations, args.lrs, args.sublinear_tf, args.min_df)]
+    if args.trials and args.trials < len(grid):
+        grid = random.Random(args.seed).sample(grid, args.trials)
+
+    start = time.perf_counter()
+    names = inference.load_disease_names(args.names)
+    class_ids = {name: class_id for class_id, name in names.items()}
+    train_data, test_data = inference.load_dataset(args.data)
+    train_tokens = tokenize_corpus(train_data['text'])
+    test_tokens = tokenize_corpus(test_data['text'])
+    features = featurize(train_tokens, test_tokens, sorted({(c['sublinear_tf'], c['min_df']) for c in grid}))
+    print(f"Tokenized {len(train_tokens) + len(test_tokens)} rows once and built {len(features)} feature sets "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    workers = max(1, args.workers)
+    options = {
+        'threads': args.threads_per_trial or max(1, (os.cpu_count() or 1) // workers),
+        'seed': args.seed, 'epochs': args.epochs, 'batch_size': args.batch_size, 'patience': args.patience,
+        'val_fraction': args.val_fraction, 'output_dim': len(names),
+        'train_y': train_data['label'].map(class_ids).to_numpy(dtype=np.int64),
+        'test_y': test_data['label'].map(class_ids).to_numpy(dtype=np.int64),
+    }
+    print(f"Running {len(grid)} trials on {workers} workers with {options['threads']} torch threads each")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(features, options)) as pool:
+        futures = [pool.submit(run_trial, trial, config) for trial, config in enumerate(grid)]
+        for future in as_completed(futures):
+            result, state = future.result()
+            results.append((result, state))
+            print(f"  trial {result['trial']:>3} done: accuracy {result['accuracy']:.4f}, "
+                  f"{result['train_seconds']:.1f}s ({len(results)}/{len(grid)})")
+
+    # Latency is timed here, one model at a time with the trial thread count, so concurrent trials do not skew it.
+    torch.set_num_threads(options['threads'])
+    for result, state in results:
+        model = torch_engine.model_from_state(state, result['activation'])
+        test_X = features[(result['sublinear_tf'], result['min_df'])][1]
+        p50, p95 = latency(model, test_X, args.latency_rows)
+        result.update(latency_p50_ms=round(p50, 4), latency_p95_ms=round(p95, 4))
+    results = [result for result, _ in results]
+
+    results.sort(key=lambda result: (result['latency_p50_ms'], -result['accuracy']))
+    with open(args.output, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f"{'trial':>5} {'hidden':>6} {'layers':>6} {'act':>5} {'lr':>7} {'sublin':>6} {'min_df':>6} "
+          f"{'accuracy':>8} {'size KB':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for result in results:
+        print(f"{result['trial']:>5} {result['hidden_dim']:>6} {result['num_layers']:>6} {result['activation']:>5} "
+              f"{result['lr']:>7.0e} {str(result['sublinear_tf']):>6} {result['min_df']:>6} {result['accuracy']:>8.4f} "
+              f"{result['size_kb']:>8.1f} {result['latency_p50_ms']:>8.3f} {result['latency_p95_ms']:>8.3f}")
+    print(f"Wrote {len(results)} trials to {args.output} in {time.perf_counter() - start:.1f}s")
+
+    accurate = [result for result in results if result['accuracy'] >= args.min_accuracy]
+    if accurate:
+        best = accurate[0]
+        print(f"Fastest trial with accuracy >= {args.min_accuracy}: #{best['trial']} "
+              f"(hidden_dim={best['hidden_dim']}, num_layers={best['num_layers']}, activation={best['activation']}, "
+              f"lr={best['lr']}, sublinear_tf={best['sublinear_tf']}, min_df={best['min_df']})")
+    else:
+        print(f"No trial reached accuracy {args.min_accuracy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+import advice_index
+import artifact
+import classifiers
+import evidence_index
+import featurizer
+import tracing
+from app.tipo import nltk_utils
+from data.Healthguide import health_advice
+
+DATA_PATH = 'data/Symptom2Disease.csv'
+MODEL_PATH = 'modelo/trem_model.pth'
+NAMES_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'nome.txt')
+
+CONFIDENCE_THRESHOLD = 0.7
+WARMUP_MESSAGE = "I have a headache and a fever"
+ENGINES = ('torch', 'numpy')
+
+
+def load_disease_names(file_path):
+    ConditionNames = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            pairs = line.strip().split(',')
+            for pair in pairs:
+                if ':' in pair:
+                    key, value = pair.split(':', 1)
+                    ConditionNames[int(key)] = value
+    return ConditionNames
+
+
+def load_dataset(data_path=DATA_PATH):
+    # pandas and the sklearn splitter are only needed on the refit path, keep them off the bundle startup path.
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(data_path)
+    df.drop('Unnamed: 0', axis=1, inplace=True)
+    df.drop_duplicates(inplace=True)
+    train_data, test_data = train_test_split(df, test_size=0.15, random_state=42)
+    return train_data, test_data
+
+
+class InferenceContext:
+    def __init__(self, vectorizer, engine, names, advice, artifact_id=None, advice_index=None,
+                 evidence_index=None):
+        self.vectorizer = vectorizer
+        self.featurizer = featurizer.compile_featurizer(vectorizer)
+        self.engine = engine
+        self.names = names
+        self.health_advice = advice
+        self.advice_index = advice_index
+        self.evidence_index = evidence_index
+        self.artifact_id = artifact_id
+        self.build_seconds = 0.0
+        self.warmup_seconds = 0.0
+
+    def predict_proba(self, messages):
+        with tracing.span('inference.featurize'):
+            transform_text = self.featurizer.transform(messages)
+        return self.engine.predict_proba(transform_text)
+
+    def predict(self, message):
+        pred_prob = self.predict_proba([message])[0]
+        pred_class = int(pred_prob.argmax())
+        return pred_class, float(pred_prob[pred_class])
+
+    def warmup(self):
+        start = time.perf_counter()
+        self.predict(WARMUP_MESSAGE)
+        self.warmup_seconds = time.perf_counter() - start
+
+
+def build_engine(engine='torch', state=None, activation='relu', model_path=MODEL_PATH, variant='fp32',
+                 source_id=None):
+    if engine == 'numpy':
+        if variant != 'fp32':
+            raise ValueError(f"Model variant {variant!r} is only available with the torch engine")
+        import numpy_engine
+
+        npz_path = model_path if model_path.endswith('.npz') else os.path.splitext(model_path)[0] + '.npz'
+        if state is not None:
+            model = numpy_engine.NumpyRNNModel(state, activation)
+        elif os.path.exists(npz_path):
+            model = numpy_engine.NumpyRNNModel.from_npz(npz_path)
+        else:
+            model = numpy_engine.NumpyRNNModel.from_checkpoint(model_path, activation)
+        return numpy_engine.NumpyEngine(model)
+    if engine == 'torch':
+        import torch_engine
+
+        if state is not None:
+            model = torch_engine.model_from_state(state, activation)
+        else:
+            model = torch_engine.load_checkpoint(model_path, activation)
+        if variant != 'fp32':
+            import quantize
+
+            module = quantize.load_variant(model, variant, quantize.variant_path(model_path, variant),
+                                           source_id or quantize.model_id(model))
+            return quantize.QuantizedEngine(module, variant)
+        return torch_engine.TorchEngine(model)
+    raise ValueError(f"Unknown inference engine {engine!r}, expected one of {ENGINES}")
+
+
+def build_ensemble(primary, backend_names, arrays, vectorizer, names, data_path, budget_ms):
+    if arrays is None:
+        if not os.path.exists(data_path):
+            print(f"Debug: No classifier backends in the bundle and no {data_path} to train them, ensemble disabled")
+            return primary
+        print(f"Debug: Training classifier backends from {data_path} (re-export the bundle to precompute them)")
+        arrays = classifiers.build_arrays(vectorizer, names, data_path)
+    return classifiers.EnsembleEngine(primary, classifiers.build_backends(arrays, backend_names),
+                                      CONFIDENCE_THRESHOLD, budget_ms)
+
+
+def build_inference_context(data_path=DATA_PATH, model_path=MODEL_PATH, names_path=NAMES_PATH,
+                            bundle_path=artifact.BUNDLE_PATH, engine='torch', variant='fp32', ensemble=(),
+                            ensemble_budget_ms=classifiers.ENSEMBLE_BUDGET_MS):
+    start = time.perf_counter()
+    if bundle_path and os.path.exists(bundle_path):
+        bundle = artifact.load_bundle(bundle_path)
+        vectorizer = bundle.build_vectorizer()
+        if bundle.advice is not None:
+            index = advice_index.AdviceIndex.from_arrays(bundle.advice, bundle.input_dim)
+        else:
+            print(f"Debug: Bundle {bundle_path} has no advice index, building it (re-export to precompute it)")
+            index = advice_index.AdviceIndex.build(vectorizer, bundle.names, health_advice)
+        evidence = None
+        if bundle.evidence is not None:
+            evidence = evidence_index.EvidenceIndex.from_arrays(bundle.evidence, bundle.input_dim)
+        elif os.path.exists(data_path):
+            print(f"Debug: Bundle {bundle_path} has no evidence index, building it from {data_path}")
+            evidence = evidence_index.EvidenceIndex.build(vectorizer, data_path)
+        primary = build_engine(engine, bundle.state, bundle.manifest['activation'], model_path=model_path,
+                               variant=variant, source_id=bundle.sha256)
+        if ensemble:
+            primary = build_ensemble(primary, ensemble, bundle.classifiers, vectorizer, bundle.names, data_path,
+                                     ensemble_budget_ms)
+        context = InferenceContext(vectorizer, primary, bundle.names, health_advice, artifact_id=bundle.sha256,
+                                   advice_index=index, evidence_index=evidence)
+    else:
+        if bundle_path:
+            print(f"Debug: No inference bundle at {bundle_path}, refitting the vectorizer from {data_path}")
+        names = load_disease_names(names_path)
+
+        train_data, _ = load_dataset(data_path)
+        vectorizer = nltk_utils.cria_tfidf_vector()
+        vectorizer.fit(train_data['text'])
+
+        primary = build_engine(engine, model_path=model_path, variant=variant)
+        if ensemble:
+            primary = build_ensemble(primary, ensemble, None, vectorizer, names, data_path, ensemble_budget_ms)
+        context = InferenceContext(vectorizer, primary, names, health_advice,
+                                   advice_index=advice_index.AdviceIndex.build(vectorizer, names, health_advice),
+                                   evidence_index=evidence_index.EvidenceIndex.build(vectorizer, data_path))
+
+    context.build_seconds = time.perf_counter() - start
+    context.warmup()
+    if ensemble:
+        engine = f"{engine}+{'+'.join(ensemble)}"
+    print(f"Debug: Inference context ({engine}, {variant}) built in {context.build_seconds:.3f}s, "
+          f"warmup took {context.warmup_seconds:.3f}s")
+    return context
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_inference_context(**kwargs):
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = build_inference_context(**kwargs)
+    return _context
@@ -0,0 +1,109 @@
+import re
+import string
+
+GREETING = 'greeting'
+FAREWELL = 'farewell'
+BOOKING = 'booking'
+SYMPTOMS = 'symptoms'
+
+BOOKING_KEYWORDS = ('appointment', 'book', 'schedule')
+# Typo variants are only generated for words and phrases at least this long; shorter ones collide with
+# ordinary words too easily ("hell" for "hello").
+TYPO_MIN_LENGTH = 6
+
+# Apostrophes are dropped ("what's" -> "whats") and every other punctuation mark splits words.
+_NORMALIZE_TABLE = str.maketrans({**{char: ' ' for char in string.punctuation + '“”–—'},
+                                  "'": None, '‘': None, '’': None})
+
+
+def normalize(message):
+    return ' '.join(message.lower().translate(_NORMALIZE_TABLE).split())
+
+
+def trie_pattern(words):
+    # Alternation factored by common prefix ("app(?:ointment|intment)"), so the regex engine tries one
+    # branch per character instead of every keyword at every position.
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    return pattern(trie)
+
+
+def typo_variants(text):
+    # One deleted or two swapped characters: the typos people make most often when typing quickly.
+    variants = set()
+    for i in range(len(text)):
+        if text[i] != ' ':
+            variants.add(text[:i] + text[i + 1:])
+        if i + 1 < len(text) and text[i] != text[i + 1]:
+            variants.add(text[:i] + text[i + 1] + text[i] + text[i + 2:])
+    variants.discard(text)
+    return {variant for variant in variants if variant.strip() == variant and '  ' not in variant}
+
+
+class IntentRouter:
+    def __init__(self, greetings, farewells, booking_keywords=BOOKING_KEYWORDS, typo_min_length=TYPO_MIN_LENGTH):
+        self.phrases = {}
+        for intent, phrases in ((GREETING, greetings), (FAREWELL, farewells)):
+            for phrase in phrases:
+                # Greetings win on phrases listed under both, as they did with the list checks.
+                self.phrases.setdefault(normalize(phrase), intent)
+        self.phrases.pop('', None)
+
+        self.near_misses = {}
+        ambiguous = set()
+        for phrase, intent in self.phrases.items():
+            if len(phrase) < typo_min_length:
+                continue
+            for variant in typo_variants(phrase):
+                if self.near_misses.setdefault(variant, intent) != intent:
+                    ambiguous.add(variant)
+        for variant in ambiguous | set(self.phrases):
+            self.near_misses.pop(variant, None)
+
+        keywords = set()
+        for keyword in booking_keywords:
+            keywords.add(keyword)
+            if len(keyword) >= typo_min_length:
+                keywords.update(typo_variants(keyword))
+        self.booking_re = re.compile(trie_pattern(keywords))
+        # Small talk is short: longer messages skip normalization and the phrase tables altogether.
+        self.max_phrase_length = 2 * max(map(len, self.phrases), default=0)
+
+    def is_booking(self, text):
+        # Keywords only count at a word start, so "facebook" is not a booking request. Checking that on
+        # the rare match is cheaper than a \b the regex would test at every position.
+        for match in self.booking_re.finditer(text):
+            start = match.start()
+            if start == 0 or not text[start - 1].isalnum():
+                return True
+        return False
+
+    def route(self, message):
+        if len(message) > self.max_phrase_length:
+            return BOOKING if self.is_booking(message.lower()) else SYMPTOMS
+        text = normalize(message)
+        intent = self.phrases.get(text)
+        if intent is not None:
+            return intent
+        if self.is_booking(text):
+            return BOOKING
+        return self.near_misses.get(text, SYMPTOMS)
+
+
+def build_router():
+    from app.tipo.responses import greetings, farewell
+    return IntentRouter(greetings, farewell)
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+# Model labels (nome.txt) whose Healthguide.py or disease_to_doctor entry is spelled differently beyond
+# case and spacing. Keys and values are compared after label_key().
+ALIASES = {
+    'chicken pox': ('chickenpox',),
+    'dimorphic hemorrhoids': ('hemorrhoids',),
+}
+
+Label = namedtuple('Label', ['class_id', 'name', 'advice', 'doctor'])
+
+
+def label_key(name):
+    return ' '.join(name.lower().split())
+
+
+def resolve(name, entries, source, aliases=ALIASES):
+    keys = {}
+    for entry in entries:
+        keys.setdefault(label_key(entry), []).append(entry)
+    key = label_key(name)
+    matches = [entry for candidate in (key,) + tuple(aliases.get(key, ())) for entry in keys.get(candidate, [])]
+    if len(matches) > 1:
+        raise ValueError(f"Label {name!r} matches several {source} entries: {matches}")
+    return matches[0] if matches else None
+
+
+def build_label_table(names, advice, doctors, aliases=ALIASES):
+    # One row per class id with everything a reply needs, so a prediction is a single index into a tuple.
+    class_ids = sorted(names)
+    if class_ids != list(range(len(class_ids))):
+        raise ValueError(f"Class ids must be 0..{len(class_ids) - 1} without gaps, got {class_ids}")
+
+    labels = []
+    problems = []
+    used_advice = set()
+    used_doctors = set()
+    for class_id in class_ids:
+        name = names[class_id]
+        advice_key = resolve(name, advice, 'health_advice', aliases)
+        doctor_key = resolve(name, doctors, 'disease_to_doctor', aliases)
+        if advice_key is None:
+            problems.append(f"{class_id}:{name} has no health_advice entry")
+        elif not advice[advice_key]:
+            problems.append(f"{class_id}:{name} has an empty health_advice entry {advice_key!r}")
+        if doctor_key is None:
+            problems.append(f"{class_id}:{name} has no disease_to_doctor entry")
+        if advice_key is None or doctor_key is None or not advice[advice_key]:
+            continue
+        used_advice.add(advice_key)
+        used_doctors.add(doctor_key)
+        # Healthguide.py repeats some advice within a condition; each string is kept once.
+        labels.append(Label(class_id, name, tuple(dict.fromkeys(advice[advice_key])), doctors[doctor_key]))
+    if problems:
+        raise ValueError("Unmapped classes in the label table (add the spelling to label_table.ALIASES):\n  "
+                         + "\n  ".join(problems))
+
+    unused = sorted(set(advice) - used_advice) + sorted(set(doctors) - used_doctors)
+    if unused:
+        print(f"Debug: Label table does not use these advice/doctor entries: {unused}")
+    return tuple(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and print the class id -> label, advice and doctor table.")
+    parser.add_argument('--names', default=None, help="Label file (default: nome.txt next to the model).")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    import book_appointment
+    import inference
+    from data.Healthguide import health_advice
+
+    names = inference.load_disease_names(args.names or inference.NAMES_PATH)
+    for label in build_label_table(names, health_advice, book_appointment.disease_to_doctor):
+        print(f"{label.class_id:>3} {label.name:<32} {len(label.advice):>3} advice  {label.doctor}")
+
+
+if __name__ == "__main__":
+    main()
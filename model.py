@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 from torch import nn
 
@@ -6,7 +7,8 @@ class CustomRNNModel(nn.Module):
     def __init__(self, input_dim=1080, hidden_dim=240, output_dim=24, num_layers=1, activation='relu'):
         super(CustomRNNModel, self).__init__()
         self.recurrent_layer = nn.RNN(input_size=input_dim, hidden_size=hidden_dim,
-                                      num_layers=num_layers, nonlinearity=activation, bias=True)
+                                      num_layers=num_layers, nonlinearity=activation, bias=True,
+                                      batch_first=True)
         self.fc_layer = nn.Linear(hidden_dim, output_dim)
     def forward(self, input_tensor):
         rnn_output, hidden_state = self.recurrent_layer(input_tensor)
@@ -15,3 +17,32 @@ class CustomRNNModel(nn.Module):
 
         output = self.fc_layer(rnn_output)
         return output
+
+    def forward_batch(self, input_tensor):
+        # One message per sequence: (batch, features) -> (batch, seq_len=1, features).
+        rnn_output, hidden_state = self.recurrent_layer(input_tensor.unsqueeze(1))
+        return self.fc_layer(rnn_output[:, -1])
+
+    def forward_sparse(self, sparse_input):
+        # Each CSR row is scored as its own one-step sequence, so the first layer reduces to
+        # gathering the weight_ih columns of the active terms and summing them.
+        batch_size = sparse_input.shape[0]
+        indices = torch.from_numpy(sparse_input.indices.astype(np.int64))
+        values = torch.from_numpy(sparse_input.data.astype(np.float32))
+        rows = torch.repeat_interleave(torch.arange(batch_size),
+                                       torch.from_numpy(np.diff(sparse_input.indptr).astype(np.int64)))
+
+        weight_ih = self.recurrent_layer.weight_ih_l0
+        projected = torch.zeros(batch_size, weight_ih.shape[0], dtype=weight_ih.dtype)
+        projected.index_add_(0, rows, weight_ih.index_select(1, indices).t() * values.unsqueeze(1))
+        return self.forward_projected(projected)
+
+    def forward_projected(self, projected):
+        rnn = self.recurrent_layer
+        activation = torch.relu if rnn.nonlinearity == 'relu' else torch.tanh
+        hidden = activation(projected + rnn.bias_ih_l0 + rnn.bias_hh_l0)
+        for layer in range(1, rnn.num_layers):
+            weight_ih = getattr(rnn, f'weight_ih_l{layer}')
+            bias = getattr(rnn, f'bias_ih_l{layer}') + getattr(rnn, f'bias_hh_l{layer}')
+            hidden = activation(hidden @ weight_ih.t() + bias)
+        return self.fc_layer(hidden)
@@ -0,0 +1,120 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from functools import lru_cache
+
+RESOURCE_DIR = os.getenv('NLTK_RESOURCE_DIR',
+                         os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'nltk_data')))
+MANIFEST_NAME = 'manifest.json'
+# Only the English files are provisioned. The first item is the package name nltk.download() expects.
+RESOURCES = {
+    'stopwords': ('stopwords', ['corpora/stopwords/english']),
+    'punkt_tab': ('punkt_tab', ['tokenizers/punkt_tab/english/abbrev_types.txt',
+                                'tokenizers/punkt_tab/english/collocations.tab',
+                                'tokenizers/punkt_tab/english/ortho_context.tab',
+                                'tokenizers/punkt_tab/english/sent_starters.txt']),
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(resource_dir=RESOURCE_DIR):
+    path = os.path.join(resource_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+@lru_cache(maxsize=None)
+def ensure(name):
+    # Resolves a resource without ever downloading: the checksummed cache first, then whatever NLTK data
+    # directory is already on this machine.
+    import nltk
+
+    files = RESOURCES[name][1]
+    checksums = (load_manifest() or {}).get('files', {})
+    if all(relative in checksums for relative in files):
+        for relative in files:
+            path = os.path.join(RESOURCE_DIR, relative)
+            if not os.path.exists(path) or file_sha256(path) != checksums[relative]:
+                raise ValueError(f"NLTK resource {relative} in {RESOURCE_DIR} is missing or does not match "
+                                 f"its checksum. Re-run nltk_resources.py.")
+        if RESOURCE_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, RESOURCE_DIR)
+        return RESOURCE_DIR
+
+    try:
+        for relative in files:
+            nltk.data.find(relative)
+    except LookupError:
+        raise LookupError(f"NLTK resource {name!r} is not available offline. Run "
+                          f"`python nltk_resources.py --download` where there is network access and ship "
+                          f"{RESOURCE_DIR} with the app.") from None
+    # stderr, so command-line tools that stream results to stdout are not corrupted by it.
+    print(f"Debug: NLTK resource {name} is not in {RESOURCE_DIR}, using the NLTK data path", file=sys.stderr)
+    return None
+
+
+@lru_cache(maxsize=None)
+def stop_words(language='english'):
+    ensure('stopwords')
+    from nltk.corpus import stopwords
+
+    return stopwords.words(language)
+
+
+def provision(resource_dir=RESOURCE_DIR, download=False):
+    import nltk
+
+    checksums = {}
+    with tempfile.TemporaryDirectory() as download_dir:
+        for name, (package, files) in RESOURCES.items():
+            for relative in files:
+                try:
+                    source = nltk.data.find(relative)
+                except LookupError:
+                    if not download:
+                        raise SystemExit(f"{relative} is not in the NLTK data path. Pass --download to fetch "
+                                         f"{package}.")
+                    if not nltk.download(package, download_dir=download_dir, quiet=True):
+                        raise SystemExit(f"Could not download {package}")
+                    source = nltk.data.find(relative, paths=[download_dir])
+                target = os.path.join(resource_dir, relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with source.open() as reader, open(target, 'wb') as writer:
+                    shutil.copyfileobj(reader, writer)
+                checksums[relative] = file_sha256(target)
+
+    manifest = {'nltk_version': nltk.__version__, 'files': checksums}
+    tmp_path = os.path.join(resource_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(resource_dir, MANIFEST_NAME))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the English NLTK stop words and Punkt tables into a "
+                                                 "local, checksummed cache the app reads offline.")
+    parser.add_argument('--output', default=RESOURCE_DIR)
+    parser.add_argument('--download', action='store_true',
+                        help="Fetch resources missing from the NLTK data path (needs network access).")
+    args = parser.parse_args()
+
+    manifest = provision(args.output, args.download)
+    print(f"Wrote {len(manifest['files'])} files and {MANIFEST_NAME} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,175 @@
+import re
+import sys
+from functools import lru_cache
+
 import nltk
-from nltk.tokenize import word_tokenize
+from nltk.tokenize import NLTKWordTokenizer, sent_tokenize, word_tokenize
 from sklearn.feature_extraction.text import TfidfVectorizer
 from nltk.stem.snowball import SnowballStemmer
-from nltk.corpus import stopwords
 
-nltk.download('stopwords')
-nltk.download('punkt')
+from app.tipo import nltk_resources
 
 english_stemmer = SnowballStemmer('english')
+STEM_CACHE_SIZE = 16384
 
 
 def stem_tokenizar(text):
+    nltk_resources.ensure('punkt_tab')
     tokens = word_tokenize(text)
     stemmed_tokens = [english_stemmer.stem(token) for token in tokens]
     return stemmed_tokens
 
 
-stop_words = stopwords.words('english')
+# Fast path of word_tokenize. Sentences are split with a regex wherever Punkt's decision is
+# unambiguous (a plain word before the period, no abbreviation, initial, number or ellipsis) and
+# words with a single precompiled pattern mirroring NLTKWordTokenizer's rules. Anything outside
+# those cases goes to the NLTK implementation, including any quote or bracket, curly ones too, that
+# Punkt would realign across a sentence break. benchmarks/bench_tokenizer.py checks the output
+# against stem_tokenizar on the dataset and on fuzzed punctuation-heavy strings.
+_SENTENCE_END_RE = re.compile(r"[.?!]")
+_PUNKT_NON_WORD = set(")\";}]*:@'({[\u2018\u2019\u201c\u201d\xab\xbb?!")
+_PUNKT_REALIGN = set("\"')]}\u2018\u2019\u201c\u201d\xab\xbb")
+_PLAIN_WORD_RE = re.compile(r"[^\W\d_]{2,}(?:-[^\W\d_]+)*|[^\W\d_]+(?:-[^\W\d_]+)+")
+_WORD_FALLBACK_RE = re.compile(r"[\"`\u00ab\u00bb\u201c\u201d\u2018\u2019\u201e()\[\]{}<>]|--|[,:][,:]"
+                               r"|'(?!\w)|(?<!\w)'|'\w*'")
+_CONTRACTIONS_RE = re.compile(r"(?i)\b(can)(not)\b|\b(d)('ye)\b|\b(gim)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b"
+                              r"|\b(lem)(me)\b|\b(more)('n)\b"
+                              r"|\b(wan)(na)(?=\s|$|[;@#$%&?!*\u2012-\u2015]|[,:](?!\d)|\.\.)")
+_WORD_RE = re.compile(r"\.{2,}|[;@#$%&?!*\u2012-\u2015]|[,:](?!\d)"
+                      r"|(?:[^\s;@#$%&?!*\u2012-\u2015,:.]|[,:](?=\d)|\.(?!\.))+")
+_CLITIC_RE = re.compile(r"(?<=[^' ])('[sSmMdD]|'ll|'LL|'re|'RE|'ve|'VE|n't|N'T)$")
+_treebank_word_tokenizer = NLTKWordTokenizer()
+# Checked against word_tokenize once per process before the fast path is used: abbreviations, initials,
+# numbers, ellipses, contractions, clitics, ASCII and curly quotes around sentence breaks.
+PARITY_SAMPLE = (
+    "I have a headache and a fever. It started yesterday.",
+    "Dr. Smith said it's fine, e.g. rest etc. but I can't sleep!",
+    "My temperature was 38.5 degrees... is that bad? I don't know.",
+    "The pain is \"sharp\". It gets worse at night (mostly).",
+    "e etc. \u201c", "my skin itches.  \u201cworse\u201d", "fever. \xab it is worse \xbb",
+    "I'm gonna need help; she'll call U.S. doctors tomorrow -- maybe.",
+)
+
+
+@lru_cache(maxsize=1)
+def _punkt_params():
+    # Same Punkt model sent_tokenize uses, loaded through the public PunktTokenizer class (older NLTK releases
+    # load the pickle instead). The parameters themselves have no public accessor, which is why the fast path
+    # is checked against word_tokenize before it is trusted.
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer
+        nltk_resources.ensure('punkt_tab')
+        params = PunktTokenizer('english')._params
+    except ImportError:
+        params = nltk.data.load('tokenizers/punkt/english.pickle')._params
+    return params.abbrev_types, frozenset(first for first, _ in params.collocations)
+
+
+def _is_plain_sentence_end(word):
+    if not _PLAIN_WORD_RE.fullmatch(word):
+        return False
+    abbrev_types, collocation_starts = _punkt_params()
+    word = word.lower()
+    return (word not in abbrev_types and word.split('-')[-1] not in abbrev_types
+            and word not in collocation_starts)
+
+
+def _fast_sentences(text):
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        end = match.end()
+        following = text[end:end + 1]
+        if not following:
+            break
+        if not following.isspace():
+            if following in _PUNKT_NON_WORD:
+                return None
+            continue
+        next_start = end + len(text[end:]) - len(text[end:].lstrip())
+        if next_start == len(text):
+            break
+        if text[next_start] in _PUNKT_REALIGN:
+            return None
+        previous = text[match.start() - 1:match.start()]
+        if match.group() == '.':
+            word = text[:match.start()].rsplit(None, 1)[-1] if previous and not previous.isspace() else ''
+            if not _is_plain_sentence_end(word):
+                return None
+        elif previous in ('.', '?', '!'):
+            return None
+        sentences.append(text[start:end])
+        start = next_start
+    sentences.append(text[start:len(text.rstrip())])
+    return [sentence for sentence in sentences if sentence]
+
+
+def _tokenize_sentence(sentence):
+    if _WORD_FALLBACK_RE.search(sentence):
+        return _treebank_word_tokenizer.tokenize(sentence)
+    final_period = sentence.endswith('.') and not sentence.endswith('..')
+    if final_period:
+        sentence = sentence[:-1]
+    sentence = _CONTRACTIONS_RE.sub(lambda m: ' ' + ' '.join(g for g in m.groups() if g) + ' ', sentence)
+    tokens = []
+    for token in _WORD_RE.findall(sentence):
+        clitic = _CLITIC_RE.search(token) if "'" in token else None
+        if clitic:
+            tokens += [token[:clitic.start()], clitic.group()]
+        else:
+            tokens.append(token)
+    if final_period:
+        tokens.append('.')
+    return tokens
+
+
+@lru_cache(maxsize=1)
+def fast_path_verified():
+    # An NLTK release that changes Punkt or the Treebank rules turns the fast path off instead of silently
+    # changing the features the model sees.
+    nltk_resources.ensure('punkt_tab')
+    for text in PARITY_SAMPLE:
+        for sample in (text, text.lower()):
+            if _tokenizar_regex(sample) != word_tokenize(sample):
+                print(f"Warning: the fast tokenizer disagrees with word_tokenize under NLTK {nltk.__version__} "
+                      f"on {sample!r}, using word_tokenize", file=sys.stderr)
+                return False
+    return True
+
+
+def tokenizar_rapido(text):
+    if not fast_path_verified():
+        return word_tokenize(text)
+    return _tokenizar_regex(text)
+
+
+def _tokenizar_regex(text):
+    sentences = _fast_sentences(text)
+    if sentences is None:
+        nltk_resources.ensure('punkt_tab')
+        sentences = sent_tokenize(text)
+    return [token for sentence in sentences for token in _tokenize_sentence(sentence)]
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem_cached(token):
+    return english_stemmer.stem(token)
+
+
+def stem_tokenizar_rapido(text):
+    return [stem_cached(token) for token in tokenizar_rapido(text)]
+
+
+def __getattr__(name):
+    # stop_words stays a module attribute, but the list is only read from disk on first use.
+    if name == 'stop_words':
+        return nltk_resources.stop_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def cria_tfidf_vector():
-    tfidf_vectorizer = TfidfVectorizer(tokenizer=stem_tokenizar, stop_words=stop_words)
+def cria_tfidf_vector(**kwargs):
+    kwargs.setdefault('tokenizer', stem_tokenizar_rapido)
+    if 'stop_words' not in kwargs:
+        kwargs['stop_words'] = nltk_resources.stop_words()
+    tfidf_vectorizer = TfidfVectorizer(**kwargs)
     return tfidf_vectorizer
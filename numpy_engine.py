@@ -0,0 +1,123 @@
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+
+import tracing
+
+NPZ_MODEL_PATH = 'modelo/trem_model.npz'
+
+
+def load_npz_state(path):
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files if key != 'activation'}
+        activation = data['activation'].item() if 'activation' in data.files else 'relu'
+    return state, activation
+
+
+def export_npz(state, path=NPZ_MODEL_PATH, activation='relu'):
+    arrays = {key: np.asarray(value.detach().cpu().numpy() if hasattr(value, 'detach') else value)
+              for key, value in state.items()}
+    with open(path, 'wb') as file:
+        np.savez(file, activation=np.array(activation), **arrays)
+
+
+class NumpyRNNModel:
+    def __init__(self, state, activation='relu'):
+        if activation not in ('relu', 'tanh'):
+            raise ValueError(f"Unsupported activation {activation!r}")
+        self.activation = activation
+        num_layers = sum(1 for key in state if key.startswith('recurrent_layer.weight_ih_l'))
+        # Single-step sequences start from a zero hidden state, so weight_hh only contributes its bias.
+        self.weights_ih = [np.ascontiguousarray(np.asarray(state[f'recurrent_layer.weight_ih_l{layer}'],
+                                                           dtype=np.float32).T)
+                           for layer in range(num_layers)]
+        self.biases = [np.asarray(state[f'recurrent_layer.bias_ih_l{layer}'], dtype=np.float32)
+                       + np.asarray(state[f'recurrent_layer.bias_hh_l{layer}'], dtype=np.float32)
+                       for layer in range(num_layers)]
+        self.fc_weight = np.ascontiguousarray(np.asarray(state['fc_layer.weight'], dtype=np.float32).T)
+        self.fc_bias = np.asarray(state['fc_layer.bias'], dtype=np.float32)
+
+    @classmethod
+    def from_npz(cls, path=NPZ_MODEL_PATH):
+        state, activation = load_npz_state(path)
+        return cls(state, activation)
+
+    @classmethod
+    def from_checkpoint(cls, path, activation='relu'):
+        import torch
+
+        state = torch.load(path, map_location=torch.device('cpu'))
+        return cls({key: value.numpy() for key, value in state.items()}, activation)
+
+    @property
+    def input_dim(self):
+        return self.weights_ih[0].shape[0]
+
+    def input_projection(self, transform_text):
+        if sp.issparse(transform_text):
+            projected = sp.csr_matrix(transform_text, dtype=np.float32) @ self.weights_ih[0]
+        else:
+            projected = np.asarray(transform_text, dtype=np.float32) @ self.weights_ih[0]
+        return np.asarray(projected)
+
+    def forward_projected(self, projected):
+        hidden = self._activate(projected + self.biases[0])
+        for weight_ih, bias in zip(self.weights_ih[1:], self.biases[1:]):
+            hidden = self._activate(hidden @ weight_ih + bias)
+        return hidden @ self.fc_weight + self.fc_bias
+
+    def logits(self, transform_text):
+        return self.forward_projected(self.input_projection(transform_text))
+
+    def _activate(self, values):
+        if self.activation == 'relu':
+            return np.maximum(values, 0.0)
+        return np.tanh(values)
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class NumpyEngine:
+    name = 'numpy'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, transform_text):
+        with tracing.span('engine.forward'):
+            logits = self.model.logits(transform_text)
+        with tracing.span('engine.softmax'):
+            return softmax(logits)
+
+    def column_weights(self, columns):
+        return self.model.weights_ih[0][columns]
+
+    def predict_projected(self, projected):
+        with tracing.span('engine.forward'):
+            logits = self.model.forward_projected(np.asarray(projected, dtype=np.float32))
+        with tracing.span('engine.softmax'):
+            return softmax(logits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a CustomRNNModel checkpoint into a torch-free .npz.")
+    parser.add_argument('--checkpoint', default='modelo/trem_model.pth')
+    parser.add_argument('--output', default=NPZ_MODEL_PATH)
+    parser.add_argument('--activation', default='relu')
+    args = parser.parse_args()
+
+    import torch
+
+    state = torch.load(args.checkpoint, map_location=torch.device('cpu'))
+    export_npz(state, args.output, args.activation)
+    print(f"Wrote {args.output} from {args.checkpoint} "
+          f"({sum(value.numel() for value in state.values())} parameters)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Rough per-entry cost of the OrderedDict slot and the entry tuple, on top of the key and value objects.
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def key_function(featurizer):
+    if hasattr(featurizer, 'cache_key'):
+        return featurizer.cache_key
+    # sklearn fallback: the analyzer's stemmed, stop-word filtered tokens, counted and order-free.
+    analyzer = featurizer.build_analyzer()
+    return lambda message: tuple(sorted(Counter(analyzer(message)).items()))
+
+
+def entry_size(key, value):
+    return (sys.getsizeof(key) + sum(sys.getsizeof(item) for item in key)
+            + sys.getsizeof(value) + ENTRY_OVERHEAD_BYTES)
+
+
+class PredictionCache:
+    def __init__(self, key_function, max_entries=4096, max_bytes=4 * 1024 * 1024, ttl_seconds=3600.0,
+                 artifact_id=None, clock=time.monotonic, cut_short=None):
+        self.key_function = key_function
+        # Optional counter of answers the engine returned incomplete (an ensemble out of time budget).
+        self.cut_short = cut_short
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = float(ttl_seconds)
+        self.artifact_id = artifact_id
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def predict(self, message, predict, artifact_id=None):
+        if not self.max_entries:
+            return predict(message)
+        key = self.key_function(message)
+        with self._lock:
+            if artifact_id != self.artifact_id:
+                self._invalidate(artifact_id)
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, size = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+            self.misses += 1
+
+        cut_short = self.cut_short() if self.cut_short else None
+        value = predict(message)
+        # Answers cut short by the engine's budget depend on load. The counter cannot say which rows were
+        # cut, so nothing computed while it moved is stored.
+        if self.cut_short and self.cut_short() != cut_short:
+            return value
+        with self._lock:
+            # A model swap while predict() ran would make this value stale, so it is not stored.
+            if artifact_id == self.artifact_id:
+                self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        size = entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+        self._entries[key] = (value, self.clock() + self.ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _invalidate(self, artifact_id):
+        self._entries.clear()
+        self._bytes = 0
+        self.artifact_id = artifact_id
+        self.invalidations += 1
+
+    def invalidate(self, artifact_id=None):
+        with self._lock:
+            self._invalidate(artifact_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+            }
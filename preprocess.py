@@ -1,9 +1,22 @@
+import torch
 from torch.utils.data import DataLoader, TensorDataset
 
 def preprocess_data(label_X, target_y):
     preprocessed = TensorDataset(label_X, target_y)
     return preprocessed
 
-def dataloader(dataset, batch_size, shuffle, num_workers):
-    dataloader = DataLoader(dataset=dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers)
+def dataloader(dataset, batch_size, shuffle, num_workers, collate_fn=None, generator=None, worker_init_fn=None):
+    dataloader = DataLoader(dataset=dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                            collate_fn=collate_fn, generator=generator, worker_init_fn=worker_init_fn,
+                            persistent_workers=num_workers > 0)
     return dataloader
+
+class SparseRowCollator:
+    # The dataset holds row indices into a CSR matrix; rows only become dense when a batch is formed.
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __call__(self, batch):
+        rows = torch.stack([row for row, _ in batch])
+        labels = torch.stack([label for _, label in batch])
+        return torch.from_numpy(self.matrix[rows.numpy()].toarray()).float(), labels
@@ -0,0 +1,174 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import artifact
+import inference
+import tracing
+
+VARIANTS = ('fp32', 'int8', 'float16')
+QUANTIZED_DTYPES = {'int8': torch.qint8, 'float16': torch.float16}
+WEIGHT_BYTES = {torch.qint8: 1, torch.float16: 2}
+
+
+def variant_path(model_path, variant):
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.{variant}{ext or '.pth'}"
+
+
+def model_id(model):
+    # Identifies the fp32 weights a variant was built from when there is no bundle sha256 to go by.
+    return artifact.content_hash({key: value.detach().cpu().numpy() for key, value in model.state_dict().items()})
+
+
+def single_step_module(model):
+    # With one-step sequences and a zero initial state each RNN layer is a Linear layer with the
+    # two biases folded together, which is a shape dynamic quantization supports.
+    rnn = model.recurrent_layer
+    activation = nn.ReLU if rnn.nonlinearity == 'relu' else nn.Tanh
+    layers = []
+    for layer in range(rnn.num_layers):
+        weight_ih = getattr(rnn, f'weight_ih_l{layer}')
+        linear = nn.Linear(weight_ih.shape[1], weight_ih.shape[0])
+        with torch.no_grad():
+            linear.weight.copy_(weight_ih)
+            linear.bias.copy_(getattr(rnn, f'bias_ih_l{layer}') + getattr(rnn, f'bias_hh_l{layer}'))
+        layers += [linear, activation()]
+    fc_layer = nn.Linear(model.fc_layer.in_features, model.fc_layer.out_features)
+    fc_layer.load_state_dict(model.fc_layer.state_dict())
+    layers.append(fc_layer)
+    return nn.Sequential(*layers).eval()
+
+
+def quantize_module(module, variant):
+    if variant == 'fp32':
+        return module
+    if variant not in QUANTIZED_DTYPES:
+        raise ValueError(f"Unknown model variant {variant!r}, expected one of {VARIANTS}")
+    return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=QUANTIZED_DTYPES[variant])
+
+
+def save_variant(module, path, source_id):
+    torch.save({'source_sha256': source_id, 'state_dict': module.state_dict()}, path)
+
+
+def load_variant(model, variant, path, source_id):
+    # source_id is the sha256 of the bundle (or of the fp32 weights) the app is running. A variant built from
+    # another model can have the same shapes and would load silently, so it is refused instead.
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No {variant} model variant at {path}. Build it with quantize.py.")
+    # Packed quantized parameters are not plain tensors, so weights_only loading cannot read them.
+    saved = torch.load(path, map_location=torch.device('cpu'), weights_only=False)
+    built_from = saved.get('source_sha256') if isinstance(saved, dict) else None
+    if built_from != source_id:
+        raise ValueError(f"The {variant} variant at {path} was built from model {str(built_from)[:12]}, not "
+                         f"{source_id[:12]}. Rebuild it with quantize.py.")
+    module = quantize_module(single_step_module(model), variant)
+    module.load_state_dict(saved['state_dict'])
+    return module.eval()
+
+
+def weight_bytes(module):
+    # Bytes of the weights and biases the module keeps in memory. The state_dict of a float16 dynamic Linear
+    # unpacks its weight to float32, so the packed weight is counted at the width of its quantized dtype.
+    total = 0
+    for submodule in module.modules():
+        if isinstance(submodule, torch.ao.nn.quantized.dynamic.Linear):
+            weight, bias = submodule._weight_bias()
+            total += weight.nelement() * WEIGHT_BYTES[submodule._packed_params.dtype]
+            total += bias.nelement() * bias.element_size() if bias is not None else 0
+        else:
+            for tensor in list(submodule.parameters(recurse=False)) + list(submodule.buffers(recurse=False)):
+                total += tensor.nelement() * tensor.element_size()
+    return total
+
+
+class QuantizedEngine:
+    name = 'torch'
+
+    def __init__(self, module, variant):
+        self.module = module
+        self.variant = variant
+
+    def predict_proba(self, transform_text):
+        with torch.no_grad():
+            with tracing.span('engine.to_tensor'):
+                dense = torch.from_numpy(transform_text.toarray()).float()
+            with tracing.span('engine.forward'):
+                y_logits = self.module(dense)
+            with tracing.span('engine.softmax'):
+                return torch.softmax(y_logits, dim=1).numpy()
+
+
+def evaluate(engine, transform_text, labels):
+    start = time.perf_counter()
+    pred_probs = engine.predict_proba(transform_text)
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(transform_text.shape[0]):
+        engine.predict_proba(transform_text[i])
+    single_seconds = (time.perf_counter() - start) / transform_text.shape[0]
+
+    return {
+        'accuracy': float(np.mean(pred_probs.argmax(axis=1) == labels)),
+        'latency_ms': single_seconds * 1000,
+        'batch_throughput': transform_text.shape[0] / batch_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build int8/float16 variants of CustomRNNModel and gate them "
+                                                 "on hold-out accuracy.")
+    parser.add_argument('--model', default=inference.MODEL_PATH)
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--variants', nargs='+', default=['int8', 'float16'], choices=VARIANTS[1:])
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                        help="Largest accepted hold-out accuracy loss against fp32 (absolute, 0-1).")
+    args = parser.parse_args()
+
+    context = inference.build_inference_context(data_path=args.data, model_path=args.model, engine='torch')
+    _, test_data = inference.load_dataset(args.data)
+    class_ids = {name: class_id for class_id, name in context.names.items()}
+    labels = test_data['label'].map(class_ids).to_numpy()
+    transform_text = context.vectorizer.transform(test_data['text'])
+
+    source_id = context.artifact_id or model_id(context.engine.model)
+    baseline_module = single_step_module(context.engine.model)
+    baseline = evaluate(context.engine, transform_text, labels)
+    baseline['weight_bytes'] = weight_bytes(baseline_module)
+    report = {'fp32': baseline}
+
+    rejected = []
+    for variant in args.variants:
+        module = quantize_module(single_step_module(context.engine.model), variant)
+        result = evaluate(QuantizedEngine(module, variant), transform_text, labels)
+        result['weight_bytes'] = weight_bytes(module)
+        report[variant] = result
+        drop = baseline['accuracy'] - result['accuracy']
+        if drop > args.max_accuracy_drop:
+            rejected.append(variant)
+            print(f"Rejected {variant}: accuracy {result['accuracy']:.4f} is {drop:.4f} below fp32 "
+                  f"(limit {args.max_accuracy_drop:.4f})")
+            continue
+        path = variant_path(args.model, variant)
+        save_variant(module, path, source_id)
+        print(f"Wrote {variant} variant of model {source_id[:12]} to {path}")
+
+    print(f"{'variant':<10} {'accuracy':>10} {'latency ms':>12} {'batch msg/s':>12} {'weights KB':>11}")
+    for variant, result in report.items():
+        print(f"{variant:<10} {result['accuracy']:>10.4f} {result['latency_ms']:>12.3f} "
+              f"{result['batch_throughput']:>12.1f} {result['weight_bytes'] / 1024:>11.1f}")
+    if rejected:
+        raise SystemExit(f"Variants rejected by the accuracy gate: {', '.join(rejected)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ greetings = [
     "Hello, how are things?", "Hey, what's the good word?", "Hi, how's it going, champ?",
     "Hey, how's your day?", "Hi, what's the word?", "Hey, how's it hanging, mate?",
     "Hello, how's life treating you?", "Hi, what's new with you?", "Hey, how's it going, amigo?",
-    "Hello, how's everything going?", "Hi, what's the scoop?", "Hey, what's new, partner?"
+    "Hello, how's everything going?", "Hi, what's the scoop?", "Hey, what's new, partner?",
     "hello!", "hii", "hello", "hii!", "hi", "hi there!", "heyy", "good morning", "good morning!",
     "good afternoon", "good evening", "hey", "how are you", "how are you?", "how is it going",
     "how is it going?", "what's up?", "hey, how are you?", "what is popping", "good to see you!", "howdy!",
@@ -73,9 +73,9 @@ responses = [
     "Welcome! I'm here to assist you with your health concerns. Please describe your symptoms in detail, and I'll help identify potential diseases. If you need to see a doctor, I can help you book an appointment too."
 ]
 
-farewell = ["Adeus","adeus","see you soon!", "see you!", "be well!", "take it easy!", "goodbye for now!","catch you,later"
+farewell = ["Adeus","adeus","see you soon!", "see you!", "be well!", "take it easy!", "goodbye for now!","catch you,later",
             "goodbye", "have a good one!", "farewell, my friend!", "thanks", "all the best!", "good-bye",
-            "catch you later!", "take care!", "bye", "have a great day!", "peace out!","peace out","see you next time!","see you next time"
+            "catch you later!", "take care!", "bye", "have a great day!", "peace out!","peace out","see you next time!","see you next time",
             "until next time!", "catch you later!", "later", "see you", "be safe!", "thank you", "good day!",
             "hasta la vista!", "byebye!", "until we meet again!", "stay well!", "toodles!","see ya",
             "bye for now!", "adios!", "bye bye", "I’m out!", "until we chat again!", "later days!",
@@ -0,0 +1,186 @@
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import artifact
+import classifiers
+import inference
+from app.tipo import nltk_resources, nltk_utils
+
+OUTPUT_FIELDS = ['row', 'id', 'prediction', 'probability', 'confident', 'backend']
+
+_context = None
+
+
+def init_worker(options):
+    global _context
+    # Build messages go to stderr so they never mix with predictions written to stdout. The NLTK resources and
+    # the tokenizer check are lazy, so they are run here too rather than on the first chunk scored.
+    with contextlib.redirect_stdout(sys.stderr):
+        _context = inference.build_inference_context(**options)
+        for name in nltk_resources.RESOURCES:
+            nltk_resources.ensure(name)
+        nltk_utils.fast_path_verified()
+
+
+def score_chunk(texts):
+    transform_text = _context.featurizer.transform(texts)
+    engine = _context.engine
+    if isinstance(engine, classifiers.EnsembleEngine):
+        pred_probs, backends = engine.predict_with_backends(transform_text)
+    else:
+        pred_probs = engine.predict_proba(transform_text)
+        backends = [engine.name] * len(texts)
+    pred_classes = pred_probs.argmax(axis=1)
+    return [(_context.names.get(int(pred_class), "Not Found"), float(pred_prob[pred_class]), backend)
+            for pred_class, pred_prob, backend in zip(pred_classes, pred_probs, backends)]
+
+
+def read_rows(file, input_format, text_column, id_column):
+    if input_format == 'jsonl':
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield record.get(id_column), str(record.get(text_column) or '')
+    else:
+        for record in csv.DictReader(file):
+            yield record.get(id_column), record.get(text_column) or ''
+
+
+def chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ResultWriter:
+    def __init__(self, file, output_format, threshold):
+        self.file = file
+        self.output_format = output_format
+        self.threshold = threshold
+        self.rows = 0
+        self._csv = None
+        if output_format == 'csv':
+            self._csv = csv.writer(file)
+            self._csv.writerow(OUTPUT_FIELDS)
+
+    def write(self, chunk, results):
+        for (row_id, _), (prediction, probability, backend) in zip(chunk, results):
+            values = [self.rows, row_id, prediction, round(probability, 6), probability >= self.threshold, backend]
+            if self._csv is not None:
+                self._csv.writerow(values)
+            else:
+                self.file.write(json.dumps(dict(zip(OUTPUT_FIELDS, values))) + '\n')
+            self.rows += 1
+
+
+def detect_format(path, default):
+    if path and path != '-':
+        extension = os.path.splitext(path)[1].lower()
+        if extension in ('.jsonl', '.ndjson'):
+            return 'jsonl'
+        if extension == '.csv':
+            return 'csv'
+    return default
+
+
+def open_stream(path, mode):
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV or JSONL export of messages with the chatbot's "
+                                                 "model, streaming it in chunks across worker processes.")
+    parser.add_argument('input', help="CSV/JSONL file, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="CSV/JSONL file, or - for stdout")
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'])
+    parser.add_argument('--output-format', choices=['csv', 'jsonl'])
+    parser.add_argument('--text-column', default='text')
+    parser.add_argument('--id-column', default='id')
+    parser.add_argument('--chunk-size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes; 0 scores in this process.")
+    parser.add_argument('--max-in-flight', type=int, default=0,
+                        help="Chunks submitted but not yet written (default: 2 per worker).")
+    parser.add_argument('--threshold', type=float, default=inference.CONFIDENCE_THRESHOLD)
+    parser.add_argument('--engine', default='torch', choices=inference.ENGINES)
+    parser.add_argument('--variant', default='fp32')
+    # Same backends as App.py, so low-confidence rows get the answer the chat gives. The chat's time budget is
+    # off by default: with it, the answer for a row would depend on the machine's load and on --workers.
+    parser.add_argument('--ensemble', default=os.getenv('INFERENCE_ENSEMBLE', 'linear,centroid'),
+                        help="Comma-separated secondary backends for unsure rows, in order, empty for the RNN "
+                             "alone.")
+    parser.add_argument('--ensemble-budget-ms', type=float, default=None,
+                        help="Time budget per chunk for the secondary backends (default: none, every backend "
+                             "listed is consulted).")
+    parser.add_argument('--bundle', default=artifact.BUNDLE_PATH)
+    parser.add_argument('--model', default=inference.MODEL_PATH)
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--names', default=inference.NAMES_PATH)
+    args = parser.parse_args()
+
+    options = {'data_path': args.data, 'model_path': args.model, 'names_path': args.names,
+               'bundle_path': args.bundle, 'engine': args.engine, 'variant': args.variant,
+               'ensemble': tuple(name for name in args.ensemble.split(',') if name),
+               'ensemble_budget_ms': args.ensemble_budget_ms}
+    input_format = args.input_format or detect_format(args.input, 'csv')
+    output_format = args.output_format or detect_format(args.output, 'csv')
+    max_in_flight = args.max_in_flight or 2 * max(1, args.workers)
+
+    start = time.perf_counter()
+    last_report = start
+    with open_stream(args.input, 'r') as input_file, open_stream(args.output, 'w') as output_file:
+        writer = ResultWriter(output_file, output_format, args.threshold)
+        chunks = chunked(read_rows(input_file, input_format, args.text_column, args.id_column), args.chunk_size)
+
+        executor = None
+        if args.workers > 0:
+            executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(options,))
+        else:
+            init_worker(options)
+
+        # A bounded FIFO of in-flight chunks keeps memory flat and writes results in input order.
+        pending = collections.deque()
+        try:
+            for chunk in chunks:
+                texts = [text for _, text in chunk]
+                if executor is None:
+                    writer.write(chunk, score_chunk(texts))
+                else:
+                    pending.append((chunk, executor.submit(score_chunk, texts)))
+                    if len(pending) >= max_in_flight:
+                        done_chunk, future = pending.popleft()
+                        writer.write(done_chunk, future.result())
+                now = time.perf_counter()
+                if now - last_report >= 5.0:
+                    print(f"Scored {writer.rows} rows ({writer.rows / (now - start):.0f} rows/s)", file=sys.stderr)
+                    last_report = now
+            while pending:
+                done_chunk, future = pending.popleft()
+                writer.write(done_chunk, future.result())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {writer.rows} rows in {elapsed:.2f}s ({writer.rows / elapsed if elapsed else 0.0:.0f} rows/s, "
+          f"{args.workers} workers, chunks of {args.chunk_size})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
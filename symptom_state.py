@@ -0,0 +1,81 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+class SymptomState:
+    # Running term counts of the symptoms a user has described since the last diagnosis. The first layer
+    # of the model is linear in the TF-IDF row, so the state keeps its un-normalised input projection and
+    # sum of squares, and a new message only costs the weight rows of the terms it changes.
+    def __init__(self, featurizer, engine, max_turns=5):
+        self.featurizer = featurizer
+        self.engine = engine
+        self.max_turns = max(1, int(max_turns))
+        self.incremental = hasattr(engine, 'predict_projected')
+        self.reset()
+
+    def reset(self):
+        self.turns = deque()
+        self.counts = {}
+        self._projected = None
+        self._sum_squares = 0.0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def add(self, message):
+        delta = self.featurizer.column_counts(message)
+        self.turns.append(delta)
+        self._apply(delta, 1)
+        # Forgetting the oldest turn keeps the memory per session bounded by max_turns messages.
+        if len(self.turns) > self.max_turns:
+            self._apply(self.turns.popleft(), -1)
+            self._sum_squares = sum(self.featurizer.term_weight(column, count) ** 2
+                                    for column, count in self.counts.items())
+        return delta
+
+    def _apply(self, delta, sign):
+        columns = []
+        weight_deltas = []
+        for column, count in delta.items():
+            old = self.counts.get(column, 0)
+            new = old + sign * count
+            old_weight = self.featurizer.term_weight(column, old) if old else 0.0
+            new_weight = self.featurizer.term_weight(column, new) if new else 0.0
+            if new:
+                self.counts[column] = new
+            else:
+                del self.counts[column]
+            self._sum_squares += new_weight * new_weight - old_weight * old_weight
+            columns.append(column)
+            weight_deltas.append(new_weight - old_weight)
+
+        if not self.counts:
+            self._projected = None
+            self._sum_squares = 0.0
+        elif self.incremental and columns:
+            update = np.asarray(weight_deltas) @ self.engine.column_weights(columns)
+            self._projected = update if self._projected is None else self._projected + update
+
+    def predict_proba(self):
+        if not self.incremental:
+            return self.engine.predict_proba(self.featurizer.transform_counts([self.counts]))[0]
+        if self._projected is None:
+            return self.engine.predict_projected(np.zeros((1, self._hidden_dim())))[0]
+        scale = 1.0
+        if self.featurizer.norm == 'l2' and self._sum_squares > 0.0:
+            scale = math.sqrt(self._sum_squares)
+        pred_prob = self.engine.predict_projected((self._projected / scale)[np.newaxis, :])[0]
+        if hasattr(self.engine, 'combine') and pred_prob.max() < self.engine.threshold:
+            # An ensemble's secondary backends need the TF-IDF row, built only when they are consulted.
+            pred_prob = self.engine.combine(self.featurizer.transform_counts([self.counts]), pred_prob[np.newaxis, :])[0]
+        return pred_prob
+
+    def predict(self):
+        pred_prob = self.predict_proba()
+        pred_class = int(pred_prob.argmax())
+        return pred_class, float(pred_prob[pred_class])
+
+    def _hidden_dim(self):
+        return self.engine.column_weights([0]).shape[1]
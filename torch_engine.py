@@ -0,0 +1,54 @@
+import numpy as np
+import torch
+
+import tracing
+from modelo.model import CustomRNNModel
+
+
+def state_dims(state):
+    weight_ih = state['recurrent_layer.weight_ih_l0']
+    return {
+        'input_dim': weight_ih.shape[1],
+        'hidden_dim': weight_ih.shape[0],
+        'output_dim': state['fc_layer.weight'].shape[0],
+        'num_layers': sum(1 for key in state if key.startswith('recurrent_layer.weight_ih_l')),
+    }
+
+
+def model_from_state(state, activation='relu'):
+    model = CustomRNNModel(activation=activation, **state_dims(state))
+    model.load_state_dict({key: torch.as_tensor(value) for key, value in state.items()})
+    model.eval()
+    return model
+
+
+def load_checkpoint(model_path, activation='relu'):
+    state = torch.load(model_path, map_location=torch.device('cpu'))
+    return model_from_state(state, activation)
+
+
+class TorchEngine:
+    name = 'torch'
+
+    def __init__(self, model):
+        self.model = model
+        self.model.eval()
+
+    def predict_proba(self, transform_text):
+        with torch.no_grad():
+            # forward_sparse() also turns the CSR arrays into tensors; there is no dense toarray() step.
+            with tracing.span('engine.forward'):
+                y_logits = self.model.forward_sparse(transform_text)
+            with tracing.span('engine.softmax'):
+                return torch.softmax(y_logits, dim=1).numpy()
+
+    def column_weights(self, columns):
+        # Rows of the first-layer input weights for the given vocabulary columns, shape (len(columns), hidden).
+        return self.model.recurrent_layer.weight_ih_l0.detach().numpy().T[columns]
+
+    def predict_projected(self, projected):
+        with torch.no_grad():
+            with tracing.span('engine.forward'):
+                y_logits = self.model.forward_projected(torch.from_numpy(np.asarray(projected, dtype=np.float32)))
+            with tracing.span('engine.softmax'):
+                return torch.softmax(y_logits, dim=1).numpy()
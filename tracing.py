@@ -0,0 +1,245 @@
+import cProfile
+import io
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+
+PROFILE_LINES = 30
+# From Python 3.12 cProfile runs on sys.monitoring, which allows one profiler per process (and it sees every
+# thread); enabling a second raises ValueError. There, one sample is profiled at a time and the rest skipped.
+SINGLE_PROFILER = sys.version_info >= (3, 12)
+_profiler_lock = threading.Lock()
+
+
+def _start_profile():
+    # An enabled profiler, or None when another one is running. Never raises: profiling is best effort.
+    if SINGLE_PROFILER and not _profiler_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        print(f"Debug: Profiling skipped - {e}", file=sys.stderr)
+        if SINGLE_PROFILER:
+            _profiler_lock.release()
+        return None
+    return profile
+
+
+def _stop_profile(profile):
+    try:
+        profile.disable()
+    finally:
+        if SINGLE_PROFILER:
+            _profiler_lock.release()
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))]
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# Returned by every span() while tracing is off, so a disabled span costs one call and one attribute check.
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _ProfiledRequest:
+    # A sampled request: its own thread is profiled, and work it hands to other threads (the micro-batcher)
+    # adds their profiles through profile_for() so the dump covers the whole request.
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.extra = []
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self.extra.append(profile)
+
+    def __enter__(self):
+        self.profile = _start_profile()
+        if self.profile is None:
+            # Busy profiler: the request is only timed, and its batch is not profiled either.
+            self.recorder._count_skipped()
+        else:
+            self.recorder._local.request = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.recorder.record(self.name, seconds)
+        if self.profile is None:
+            return False
+        self.recorder._local.request = None
+        try:
+            _stop_profile(self.profile)
+            self.recorder._store_profile(self.name, seconds, self.profile, self.extra)
+        except Exception as e:
+            print(f"Debug: Profile of {self.name} dropped - {e!r}", file=sys.stderr)
+        return False
+
+
+class _SharedProfile:
+    def __init__(self, requests):
+        self.requests = requests
+
+    def __enter__(self):
+        # With a single profiler the sampled request's own one already covers this thread, so this one is
+        # usually skipped; either way the batch runs.
+        self.profile = _start_profile()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is None:
+            return False
+        try:
+            _stop_profile(self.profile)
+            for request in self.requests:
+                request.add(self.profile)
+        except Exception as e:
+            print(f"Debug: Batch profile dropped - {e!r}", file=sys.stderr)
+        return False
+
+
+class SpanRecorder:
+    # Rolling per-stage latency samples for the chat and booking paths. Every sample_every-th request is
+    # also run under cProfile; the last max_profiles reports are kept and optionally dumped to profile_dir
+    # as .prof files for snakeviz/flameprof.
+    def __init__(self, enabled=True, window=1024, sample_every=0, max_profiles=8, profile_dir=None):
+        self.enabled = enabled
+        self.window = max(1, int(window))
+        self.sample_every = max(0, int(sample_every))
+        self.profile_dir = profile_dir
+        self._samples = {}
+        self._counts = {}
+        self._profiles = deque(maxlen=max(1, int(max_profiles)))
+        self._requests = 0
+        self._skipped_profiles = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def request(self, name):
+        # Outermost span of a chat or booking turn; the one that decides whether the turn is profiled.
+        if not self.enabled:
+            return NULL_SPAN
+        if self.sample_every:
+            with self._lock:
+                self._requests += 1
+                sampled = self._requests % self.sample_every == 0
+            if sampled and getattr(self._local, 'request', None) is None:
+                return _ProfiledRequest(self, name)
+        return _Span(self, name)
+
+    def _count_skipped(self):
+        with self._lock:
+            self._skipped_profiles += 1
+
+    def skipped_profiles(self):
+        with self._lock:
+            return self._skipped_profiles
+
+    def active_request(self):
+        return getattr(self._local, 'request', None)
+
+    def profile_for(self, requests):
+        requests = [request for request in requests if request is not None]
+        if not requests:
+            return NULL_SPAN
+        return _SharedProfile(requests)
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+            samples.append(seconds)
+            self._counts[name] += 1
+
+    def _store_profile(self, name, seconds, profile, extra):
+        stats = pstats.Stats(profile)
+        for other in extra:
+            stats.add(other)
+        path = None
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{id(profile):x}.prof")
+            stats.dump_stats(path)
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+        with self._lock:
+            self._profiles.append({'name': name, 'seconds': seconds, 'path': path, 'report': report.getvalue()})
+
+    def profiles(self):
+        with self._lock:
+            return list(self._profiles)
+
+    def stats(self):
+        with self._lock:
+            snapshot = {name: (sorted(samples), self._counts[name]) for name, samples in self._samples.items()}
+        result = {}
+        for name, (ordered, count) in sorted(snapshot.items()):
+            result[name] = {
+                'count': count,
+                'window': len(ordered),
+                'mean_ms': sum(ordered) / len(ordered) * 1000,
+                'p50_ms': percentile(ordered, 50) * 1000,
+                'p95_ms': percentile(ordered, 95) * 1000,
+                'p99_ms': percentile(ordered, 99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._profiles.clear()
+            self._requests = 0
+            self._skipped_profiles = 0
+
+
+recorder = SpanRecorder(enabled=os.getenv('TRACE_ENABLED', '1') != '0',
+                        window=int(os.getenv('TRACE_WINDOW', '1024')),
+                        sample_every=int(os.getenv('TRACE_PROFILE_EVERY', '0')),
+                        profile_dir=os.getenv('TRACE_PROFILE_DIR') or None)
+
+
+def span(name):
+    return recorder.span(name)
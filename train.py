@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+import torch
+from torch import nn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import artifact
+import inference
+import numpy_engine
+import preprocess
+import quantize
+from app.tipo import nltk_utils
+from modelo.model import CustomRNNModel
+
+TRAIN_CACHE_PATH = 'modelo/train_features.npz'
+TRAIN_CACHE_VERSION = 1
+
+
+def set_seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.use_deterministic_algorithms(True)
+
+
+def seed_worker(worker_id):
+    worker_seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+
+def features_key(data_path, stop_words):
+    digest = hashlib.sha256()
+    with open(data_path, 'rb') as file:
+        for block in iter(lambda: file.read(65536), b''):
+            digest.update(block)
+    tokenizer = nltk_utils.cria_tfidf_vector(stop_words=stop_words).tokenizer
+    digest.update(json.dumps({'version': TRAIN_CACHE_VERSION, 'tokenizer': tokenizer.__name__,
+                              'stop_words': sorted(stop_words)}).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def save_csr(arrays, prefix, matrix):
+    arrays[f'{prefix}_data'] = matrix.data
+    arrays[f'{prefix}_indices'] = matrix.indices
+    arrays[f'{prefix}_indptr'] = matrix.indptr
+    arrays[f'{prefix}_shape'] = np.array(matrix.shape)
+
+
+def load_csr(arrays, prefix):
+    return sp.csr_matrix((arrays[f'{prefix}_data'], arrays[f'{prefix}_indices'], arrays[f'{prefix}_indptr']),
+                         shape=tuple(arrays[f'{prefix}_shape']))
+
+
+def load_features(data_path, names, cache_path=TRAIN_CACHE_PATH):
+    # Tokenizing and fitting the vectorizer is the slow part of a run, so the matrices are kept on disk
+    # and reused for as long as the CSV, tokenizer and stop words are unchanged.
+    stop_words = nltk_utils.stop_words
+    key = features_key(data_path, stop_words)
+    if cache_path and os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        if arrays['key'].item() == key:
+            vocabulary = {term: index for index, term in enumerate(arrays['vocabulary'].tolist())}
+            vectorizer = nltk_utils.cria_tfidf_vector(vocabulary=vocabulary, stop_words=stop_words)
+            vectorizer.vocabulary_ = vocabulary
+            vectorizer.idf_ = arrays['idf']
+            print(f"Debug: Loaded cached features from {cache_path}")
+            return (vectorizer, load_csr(arrays, 'train'), arrays['train_labels'],
+                    load_csr(arrays, 'test'), arrays['test_labels'])
+        print(f"Debug: Feature cache {cache_path} is stale, rebuilding it")
+
+    start = time.perf_counter()
+    train_data, test_data = inference.load_dataset(data_path)
+    class_ids = {name: class_id for class_id, name in names.items()}
+    vectorizer = nltk_utils.cria_tfidf_vector(stop_words=stop_words)
+    train_X = vectorizer.fit_transform(train_data['text']).tocsr()
+    test_X = vectorizer.transform(test_data['text']).tocsr()
+    train_y = train_data['label'].map(class_ids).to_numpy(dtype=np.int64)
+    test_y = test_data['label'].map(class_ids).to_numpy(dtype=np.int64)
+    print(f"Debug: Vectorized {train_X.shape[0] + test_X.shape[0]} rows in {time.perf_counter() - start:.2f}s")
+
+    if cache_path:
+        arrays = {'key': np.array(key), 'train_labels': train_y, 'test_labels': test_y,
+                  'vocabulary': np.array(sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get), dtype=str),
+                  'idf': vectorizer.idf_}
+        save_csr(arrays, 'train', train_X)
+        save_csr(arrays, 'test', test_X)
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, cache_path)
+    return vectorizer, train_X, train_y, test_X, test_y
+
+
+def evaluate(model, matrix, labels, loss_fn):
+    model.eval()
+    with torch.no_grad():
+        logits = model.forward_sparse(matrix)
+        targets = torch.from_numpy(labels)
+        loss = loss_fn(logits, targets).item()
+        accuracy = (logits.argmax(dim=1) == targets).float().mean().item()
+    return loss, accuracy
+
+
+def split_validation(matrix, labels, fraction, seed):
+    order = np.random.default_rng(seed).permutation(matrix.shape[0])
+    val_size = int(round(matrix.shape[0] * fraction))
+    val_rows, train_rows = np.sort(order[:val_size]), np.sort(order[val_size:])
+    return matrix[train_rows], labels[train_rows], matrix[val_rows], labels[val_rows]
+
+
+def train(model, train_X, train_y, val_X, val_y, epochs, batch_size, lr, patience, num_workers, seed,
+          verbose=True):
+    dataset = preprocess.preprocess_data(torch.arange(train_X.shape[0]), torch.from_numpy(train_y))
+    loader = preprocess.dataloader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers,
+                                   collate_fn=preprocess.SparseRowCollator(train_X),
+                                   generator=torch.Generator().manual_seed(seed), worker_init_fn=seed_worker)
+    loss_fn = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+    best_loss = float('inf')
+    best_state = None
+    best_epoch = 0
+    run_start = time.perf_counter()
+    for epoch in range(1, epochs + 1):
+        start = time.perf_counter()
+        model.train()
+        samples = 0
+        for batch_X, batch_y in loader:
+            optimizer.zero_grad()
+            loss = loss_fn(model.forward_batch(batch_X), batch_y)
+            loss.backward()
+            optimizer.step()
+            samples += batch_X.shape[0]
+        seconds = time.perf_counter() - start
+
+        val_loss, val_accuracy = evaluate(model, val_X, val_y, loss_fn)
+        if verbose:
+            print(f"Epoch {epoch:>3}: val loss {val_loss:.4f}, val accuracy {val_accuracy:.4f}, "
+                  f"{samples / seconds:.0f} samples/s, epoch {seconds:.2f}s, "
+                  f"total {time.perf_counter() - run_start:.1f}s")
+        if val_loss < best_loss:
+            best_loss, best_epoch = val_loss, epoch
+            best_state = {key: value.detach().clone() for key, value in model.state_dict().items()}
+        elif epoch - best_epoch >= patience:
+            if verbose:
+                print(f"Early stopping: no validation improvement for {patience} epochs, best epoch {best_epoch}")
+            break
+
+    model.load_state_dict(best_state)
+    return best_epoch, best_loss
+
+
+def refresh_derived(model_path, state_dict, activation):
+    # Files built from the checkpoint it just replaced: the NumPy export is rewritten from the new weights, the
+    # quantized variants need quantize.py's accuracy gate and are removed rather than left stale.
+    npz_path = os.path.splitext(model_path)[0] + '.npz'
+    if os.path.exists(npz_path):
+        numpy_engine.export_npz(state_dict, npz_path, activation)
+        print(f"Rewrote {npz_path} from the new weights")
+    for variant in quantize.VARIANTS[1:]:
+        path = quantize.variant_path(model_path, variant)
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Removed the stale {variant} variant {path}; re-run quantize.py to rebuild it")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train CustomRNNModel on Symptom2Disease.csv and write a "
+                                                 "checkpoint plus the inference bundle App.py loads.")
+    parser.add_argument('--data', default=inference.DATA_PATH)
+    parser.add_argument('--names', default=inference.NAMES_PATH)
+    parser.add_argument('--cache', default=TRAIN_CACHE_PATH, help="Feature cache path ('' disables it).")
+    parser.add_argument('--model-output', default=inference.MODEL_PATH)
+    parser.add_argument('--bundle-output', default=artifact.BUNDLE_PATH)
+    parser.add_argument('--hidden-dim', type=int, default=240)
+    parser.add_argument('--num-layers', type=int, default=1)
+    parser.add_argument('--activation', default='relu', choices=['relu', 'tanh'])
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--val-fraction', type=float, default=0.1)
+    parser.add_argument('--num-workers', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true',
+                        help="Replace an existing checkpoint or bundle (the shipped model by default).")
+    args = parser.parse_args()
+
+    existing = [path for path in (args.model_output, args.bundle_output) if path and os.path.exists(path)]
+    if existing and not args.force:
+        raise SystemExit(f"{' and '.join(existing)} already exist. Pass --force to replace them, or write the new "
+                         f"model elsewhere with --model-output and --bundle-output.")
+
+    set_seed(args.seed)
+    names = inference.load_disease_names(args.names)
+    vectorizer, train_X, train_y, test_X, test_y = load_features(args.data, names, args.cache)
+    train_X, train_y, val_X, val_y = split_validation(train_X, train_y, args.val_fraction, args.seed)
+
+    model = CustomRNNModel(input_dim=train_X.shape[1], hidden_dim=args.hidden_dim, output_dim=len(names),
+                           num_layers=args.num_layers, activation=args.activation)
+    best_epoch, best_loss = train(model, train_X, train_y, val_X, val_y, args.epochs, args.batch_size, args.lr,
+                                  args.patience, args.num_workers, args.seed)
+    test_loss, test_accuracy = evaluate(model, test_X, test_y, nn.CrossEntropyLoss())
+    print(f"Best epoch {best_epoch} (val loss {best_loss:.4f}); hold-out loss {test_loss:.4f}, "
+          f"accuracy {test_accuracy:.4f}")
+
+    torch.save(model.state_dict(), args.model_output)
+    if args.model_output in existing:
+        refresh_derived(args.model_output, model.state_dict(), args.activation)
+    manifest = artifact.export_bundle(vectorizer, model.state_dict(), names, args.bundle_output, args.activation,
+                                      data_path=args.data)
+    print(f"Wrote {args.model_output} and {args.bundle_output} (sha256 {manifest['sha256'][:12]})")
+
+
+if __name__ == "__main__":
+    main()